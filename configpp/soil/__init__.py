@@ -1,7 +1,53 @@
+import sys
+from importlib import import_module
 
-from .config import Config, ConfigBase
-from .group import Group, GroupException, GroupMember
-from .exception import SoilException
-from .transform import TransformBase, TransformException, JSONTransform, YamlTransform
-from .transport import Transport, Location, ClimberLocation
-from .utils import create_from_url
+# the public names are imported from their modules at the first access (PEP 562), so the apps pay only for what they use
+_exports = {
+    'Config': 'config',
+    'ConfigBase': 'config',
+    'Group': 'group',
+    'GroupException': 'group',
+    'GroupMember': 'group',
+    'SoilException': 'exception',
+    'TransformBase': 'transform',
+    'TransformException': 'transform',
+    'JSONTransform': 'transform',
+    'JSONBackend': 'transform',
+    'register_json_backend': 'transform',
+    'YamlTransform': 'transform',
+    'FastYamlTransform': 'transform',
+    'Transport': 'transport',
+    'Location': 'transport',
+    'ClimberLocation': 'transport',
+    'ClimberIndex': 'transport',
+    'Durability': 'transport',
+    'create_from_url': 'utils',
+    'normalize_url': 'utils',
+    'parse_url': 'utils',
+    'ConfigSpec': 'utils',
+    'ReadCache': 'cache',
+    'Watcher': 'watch',
+    'ConfigRegistry': 'registry',
+    'process_registry': 'registry',
+    'Event': 'instrument',
+    'add_observer': 'instrument',
+    'remove_observer': 'instrument',
+    'observe': 'instrument',
+}
+
+__all__ = list(_exports)
+
+def __getattr__(name: str):
+    if name not in _exports:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    value = getattr(import_module('.' + _exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
+
+if sys.version_info < (3, 7):
+    # there is no module level __getattr__ before python 3.7
+    for _name in _exports:
+        __getattr__(_name)
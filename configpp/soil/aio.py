@@ -0,0 +1,30 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+DEFAULT_MAX_WORKERS = 8
+
+_executor = None  # type: Executor
+_executor_lock = Lock()
+
+def get_executor() -> Executor:
+    """Gives back the bounded executor of the blocking file system calls of the async API"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers = DEFAULT_MAX_WORKERS)
+        return _executor
+
+def set_executor(executor: Executor):
+    """Replace the executor of the async API, eg to change the max workers"""
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking function in the executor without blocking the event loop"""
+    # asyncio is imported by the caller anyway, the soil modules import it only in the async functions to keep the import time low
+    import asyncio
+
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
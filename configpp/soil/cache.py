@@ -0,0 +1,128 @@
+import logging
+import os
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from typing import Tuple
+
+from configpp.soil import instrument
+from configpp.soil.transform import TransformBase
+
+logger = logging.getLogger(__name__)
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'size', 'entries'])
+
+def stat_key(st: os.stat_result) -> tuple:
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+class CacheEntry():
+
+    def __init__(self, key: tuple, raw: str):
+        self.key = key
+        self.raw = raw
+        self.data = {}  # type: Dict[object, object]
+
+class ReadCache():
+    """Stat validated LRU cache for the raw content and the deserialized data of the config files
+
+    The entries are valid until the (st_dev, st_ino, st_mtime_ns, st_size) of the file is not changed. The size of an entry is the
+    length of the raw content, files bigger than the max_size are not cached at all.
+
+    By default only the raw content is cached and every load deserializes it again, so the loaded data belongs to the caller.
+    With share_data the deserialized data is cached too (per transform) and every load of the file gives back the same object,
+    which must not be modified. The deserialized data is not counted in the max_size, it can be several times bigger than the
+    raw content.
+
+    Args:
+        max_size: memory budget of the cache in characters of the raw contents
+        share_data: cache the deserialized data and give back the same object for every load
+    """
+
+    def __init__(self, max_size: int = 32 * 1024 * 1024, share_data = False):
+        self._max_size = max_size
+        self._share_data = share_data
+        self._entries = OrderedDict()  # type: Dict[str, CacheEntry]
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = Lock()
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._size, len(self._entries))
+
+    def invalidate(self, target: str = None):
+        """Drop the entry of the target, or every entry if the target is None"""
+        with self._lock:
+            if target is None:
+                self._entries.clear()
+                self._size = 0
+            else:
+                self._drop(target)
+
+    def read(self, target: str) -> str:
+        return self._get_entry(target).raw
+
+    def read_with_key(self, target: str) -> Tuple[str, tuple]:
+        """Read the target file, with the stat key of the content"""
+        entry = self._get_entry(target)
+        return entry.raw, entry.key
+
+    def load(self, target: str, transform: TransformBase):
+        """Read and deserialize the target file with the transform, the file is read only if it has been changed
+
+        With share_data the cached data is given back if the file is not changed.
+        """
+        return self.load_with_key(target, transform)[0]
+
+    def load_with_key(self, target: str, transform: TransformBase) -> tuple:
+        """Load the target file like the load, with the stat key of the content
+
+        Returns:
+            tuple of the data and the key
+        """
+        entry = self._get_entry(target)
+        key = transform.cache_key
+        data = entry.data.get(key, entry)
+        if data is entry:
+            started = instrument.start()
+            data = transform.deserialize(entry.raw)
+            if started is not None:
+                instrument.emit('deserialize', target, len(entry.raw), started)
+            if self._share_data:
+                with self._lock:
+                    entry.data[key] = data
+        return data, entry.key
+
+    def _drop(self, target: str):
+        entry = self._entries.pop(target, None)
+        if entry is not None:
+            self._size -= len(entry.raw)
+
+    def _get_entry(self, target: str) -> CacheEntry:
+        key = stat_key(os.stat(target))
+
+        with self._lock:
+            entry = self._entries.get(target)
+            if entry is not None and entry.key == key:
+                self._entries.move_to_end(target)
+                self._hits += 1
+                return entry
+            self._misses += 1
+
+        with open(target) as f:
+            # the content belongs to this stat, even if the file has been changed since the first one
+            key = stat_key(os.fstat(f.fileno()))
+            entry = CacheEntry(key, f.read())
+
+        with self._lock:
+            self._drop(target)
+            if len(entry.raw) > self._max_size:
+                logger.debug("File '%s' is too big to cache (%d)", target, len(entry.raw))
+                return entry
+            self._entries[target] = entry
+            self._size += len(entry.raw)
+            while self._size > self._max_size:
+                _, evicted = self._entries.popitem(last = False)
+                self._size -= len(evicted.raw)
+
+        return entry
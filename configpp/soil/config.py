@@ -1,10 +1,16 @@
 from abc import ABC, abstractproperty, abstractmethod
 import logging
+from typing import TYPE_CHECKING, Callable, Dict, List, TextIO
 
+from configpp.soil import instrument
+from configpp.soil.aio import run_blocking
 from configpp.soil.transform import TransformBase, JSONTransform, guess_transform_for_file
 from configpp.soil.transport import Transport, Location
 from configpp.soil.exception import SoilException
 
+if TYPE_CHECKING:
+    from configpp.soil.watch import Watcher
+
 logger = logging.getLogger(__name__)
 
 DEFAULT = object()
@@ -27,6 +33,47 @@ class ConfigBase():
     def dump(self, location: Location = None) -> bool:
         """dump the stuffs"""
 
+    async def aload(self) -> bool:
+        """awaitable load, runs the blocking load in the executor of configpp.soil.aio by default"""
+        return await run_blocking(self.load)
+
+    async def adump(self, location: Location = None) -> bool:
+        """awaitable dump, runs the blocking dump in the executor of configpp.soil.aio by default"""
+        return await run_blocking(self.dump, location)
+
+    def watch(self, callback: Callable, debounce: float = 0.2, poll_interval: float = 1., use_inotify = True) -> 'Watcher':
+        """Watch the files of the loaded config and reload the changed ones in a background thread
+
+        Args:
+            callback: called in the thread of the watcher after a reload, with the config and the list of the reloaded files
+            debounce: seconds of silence to wait for after a change before the reload
+            poll_interval: seconds between the checks if inotify is not used
+            use_inotify: use inotify if it is available (Linux), otherwise poll the stat of the files
+
+        Returns:
+            the running Watcher, stop it to finish the watching
+        """
+        from configpp.soil.watch import Watcher
+
+        if self._location is None:
+            raise SoilException("Config '{}' is not loaded, cannot be watched".format(self._name))
+        files = self._watched_files()
+
+        def handler(changed):
+            reloaded = self._reload_files([config for path, config in files.items() if path in changed])
+            if reloaded:
+                callback(self, reloaded)
+
+        return Watcher(files, handler, debounce, poll_interval, use_inotify)
+
+    @abstractmethod
+    def _watched_files(self) -> Dict[str, 'ConfigFileBase']:
+        """the files to watch by their path"""
+
+    @abstractmethod
+    def _reload_files(self, configs: List['ConfigFileBase']) -> List['ConfigFileBase']:
+        """reload the changed files, gives back the reloaded ones"""
+
     @property
     def relpath(self) -> str:
         return self._name
@@ -71,10 +118,27 @@ class ConfigFileBase(ConfigBase):
         self._is_loaded = True
 
     def process_data(self, raw_data):
-        self.data = self._transform.deserialize(raw_data)
+        started = instrument.start()
+        if isinstance(raw_data, str):
+            self.data = self._transform.deserialize(raw_data)
+        else:
+            self.data = self._transform.deserialize_bytes(raw_data)
+        if started is not None:
+            instrument.emit('deserialize', self._name, len(raw_data), started)
 
     def serialize(self):
-        return self._transform.serialize(self.data)
+        started = instrument.start()
+        data = self._transform.serialize(self.data)
+        if started is not None:
+            instrument.emit('serialize', self._name, len(data), started)
+        return data
+
+    def serialize_to(self, stream: TextIO):
+        """Write the serialized data into the stream directly, used as the writer function of the Location.write"""
+        started = instrument.start()
+        self._transform.serialize_to(self.data, stream)
+        if started is not None:
+            instrument.emit('serialize', self._name, stream.tell(), started)
 
     @property
     def is_loaded(self):
@@ -91,23 +155,88 @@ class ConfigFileBase(ConfigBase):
     def load(self) -> bool:
         if self._location is None:
             raise SoilException("Location is none, config cannot be loaded! %r", self)
+        if self._location.cache is not None:
+            self.data = self._location.cache.load(self.path, self._transform)
+            return self._is_loaded
+        if self._location.mmap_threshold is not None:
+            self._load_buffer()
+            return self._is_loaded
         raw_data = self._location.read(self.relpath)
         logger.debug("Config load: %s data len: %d", self._name, len(raw_data))
         self.process_data(raw_data)
         return self._is_loaded
 
+    def _load_buffer(self) -> tuple:
+        with self._location.open_buffer_with_key(self.relpath) as (buffer, key):
+            logger.debug("Config load: %s data len: %d (%s)", self._name, len(buffer), type(buffer).__name__)
+            self.process_data(buffer)
+        return key
+
+    # friendly class: Group
+    def _load_with_key(self) -> tuple:
+        """Load like the load, gives back the stat_key of the loaded content taken from the file the load opens"""
+        if self._location.cache is not None:
+            self.data, key = self._location.cache.load_with_key(self.path, self._transform)
+            return key
+        if self._location.mmap_threshold is not None:
+            return self._load_buffer()
+        raw_data, key = self._location.read_with_key(self.relpath)
+        self.process_data(raw_data)
+        return key
+
+    # friendly class: Group
+    async def _aload_with_key(self) -> tuple:
+        if self._location.cache is not None or self._location.mmap_threshold is not None:
+            return await run_blocking(self._load_with_key)
+        raw_data, key = await self._location.aread_with_key(self.relpath)
+        await run_blocking(self.process_data, raw_data)
+        return key
+
     def dump(self, location: Location = None) -> bool:
         loc = location or self._location
         if loc is None:
             logger.error("Cannot dump config because no location!")
             return False
-        return loc.write(self.relpath, self._transform.serialize(self._data))
+        return loc.write(self.relpath, self.serialize_to)
+
+    async def aload(self) -> bool:
+        if self._location is None:
+            raise SoilException("Location is none, config cannot be loaded! %r", self)
+        if self._location.cache is not None:
+            self.data = await run_blocking(self._location.cache.load, self.path, self._transform)
+            return self._is_loaded
+        if self._location.mmap_threshold is not None:
+            await run_blocking(self._load_buffer)
+            return self._is_loaded
+        raw_data = await self._location.aread(self.relpath)
+        logger.debug("Config load: %s data len: %d", self._name, len(raw_data))
+        # the deserialization can be expensive too (eg yaml), so it should not block the loop either
+        await run_blocking(self.process_data, raw_data)
+        return self._is_loaded
+
+    async def adump(self, location: Location = None) -> bool:
+        loc = location or self._location
+        if loc is None:
+            logger.error("Cannot dump config because no location!")
+            return False
+        return await loc.awrite(self.relpath, await run_blocking(self.serialize))
 
     def remove(self) -> bool:
         if self._location is None:
             return False
         return self._location.remove(self.relpath)
 
+    def _watched_files(self) -> Dict[str, 'ConfigFileBase']:
+        return {self.path: self}
+
+    def _reload_files(self, configs: List['ConfigFileBase']) -> List['ConfigFileBase']:
+        if not self._location.check(self.relpath):
+            logger.warning("Config file '%s' has been removed, keep the loaded data", self.path)
+            return []
+        # reload from the watched location, without searching the config again
+        ConfigFileBase.load(self)
+        return [self]
+
     def __repr__(self):
         return "<Config name: '{}', transform: {}, data: {}>".format(self._name, self._transform, self._data)
 
@@ -129,13 +258,24 @@ class Config(ConfigFileBase):
 
     def load(self) -> bool:
         self._transport.init_for(self._name)
-        for location in self._transport.locations:
-            if location.check(self._name):
-                self._location = location
-                logger.info("Config: load: found at %s", location.target_path(self._name))
-                break
-        else:
+        location = self._transport.find(self._name)
+        if location is None:
             logger.info("Config: load: not found")
             return False
 
+        self._location = location
+        logger.info("Config: load: found at %s", location.target_path(self._name))
+
         return super().load()
+
+    async def aload(self) -> bool:
+        await self._transport.ainit_for(self._name)
+        location = await self._transport.afind(self._name)
+        if location is None:
+            logger.info("Config: aload: not found")
+            return False
+
+        self._location = location
+        logger.info("Config: aload: found at %s", location.target_path(self._name))
+
+        return await super().aload()
@@ -1,8 +1,12 @@
+import hashlib
 import os
 import logging
-from typing import List, Dict
-from collections import OrderedDict
+import time
+from typing import Callable, Dict, Iterable, List, Set
+from collections import OrderedDict, namedtuple
 
+from configpp.soil.aio import run_blocking
+from configpp.soil.cache import stat_key
 from configpp.soil.config import ConfigFileBase, DEFAULT, ConfigBase
 from configpp.soil.transport import Transport, Location
 from configpp.soil.exception import SoilException
@@ -10,6 +14,10 @@ from configpp.soil.transform import TransformBase, JSONTransform, guess_transfor
 
 logger = logging.getLogger(__name__)
 
+GENERATION_MARKER = '.generation'
+
+Fingerprint = namedtuple('Fingerprint', ['stat', 'digest'])
+
 class GroupException(SoilException):
     pass
 
@@ -37,10 +45,22 @@ class GroupMember(ConfigFileBase):
         self._location = location
         self._group_name = group_name
 
+    # friendly class: Group
+    def _unload(self):
+        self._data = None
+        self._is_loaded = False
+
+    async def adump(self):
+        await self._direct_adump(self._location)
+
     # friendly class: Group
     def _direct_dump(self, location: Location = None):
         super().dump(location)
 
+    # friendly class: Group
+    async def _direct_adump(self, location: Location = None):
+        await super().adump(location)
+
     def __repr__(self):
         return "<GroupMember name={}, transform={}, mandatory={}>".format(self._name, self._transform.__class__.__name__, self._mandatory)
 
@@ -48,14 +68,37 @@ class GroupMember(ConfigFileBase):
 class Group(ConfigBase):
     """Group of config collected by the transport layer
 
+    In transactional mode the dump stages all the members into temp files first, then replaces them together. The switch-over is
+    surrounded by the generation marker file of the group: it is odd while the replace is in progress and even otherwise. The load
+    reads the marker before and after reading the members and retries if the switch-over was in progress or happened meanwhile.
+    Only one writer is supported at a time.
+
+    The reload uses the fingerprints of the members taken at the load to skip the unchanged files.
+
     Args:
-        TODO:
+        name: name of the group, the folder of the members
+        configs: the members
+        transport: Transport to find the group with
+        transactional: use the transactional dump and the generation checking load
+        max_retries: max number of load attempts in transactional mode
+        retry_delay: seconds to wait between the load attempts
+        hash_content: keep the hash of the content in the fingerprints too, so the reload does not parse the files which are
+            touched but not modified. The members are read as text (through the ReadCache if the location has one), so it
+            bypasses the bytes read path of the location.
     """
 
-    def __init__(self, name: str, configs: List[GroupMember], transport: Transport = None):
+    def __init__(self, name: str, configs: List[GroupMember], transport: Transport = None, transactional = False,
+                 max_retries: int = 20, retry_delay: float = 0.05, hash_content = False):
         super().__init__(name)
         self._transport = transport or Transport()
         self._configs = OrderedDict([(cfg.name, cfg) for cfg in configs]) # type: Dict[str, GroupMember]
+        self._transactional = transactional
+        self._max_retries = max_retries
+        self._retry_delay = retry_delay
+        self._generation = None  # type: int
+        self._hash_content = hash_content
+        self._found = set()  # type: Set[str]
+        self._fingerprints = {}  # type: Dict[str, Fingerprint]
 
     @property
     def transport(self):
@@ -69,12 +112,40 @@ class Group(ConfigBase):
     def is_loaded(self) -> bool:
         return self._location is not None
 
+    @property
+    def generation(self) -> int:
+        """The generation of the last transactional load or dump"""
+        return self._generation
+
+    @property
+    def fingerprints(self) -> Dict[str, Fingerprint]:
+        """The fingerprints of the loaded members by their relative path"""
+        return self._fingerprints
+
     def add_member(self, member: GroupMember):
         self._configs[member.name] = member
 
-    def load(self) -> bool:
-        logger.debug("Group load: with %s", list(self._configs.values()))
-        self._transport.init_for(self._name)
+    def read_generation(self, location: Location = None) -> int:
+        loc = location or self._location
+        path = os.path.join(self._name, GENERATION_MARKER)
+        if not loc.check(path):
+            return 0
+        return int(loc.read(path).strip() or 0)
+
+    def _write_generation(self, location: Location, generation: int):
+        location.commit([location.stage(os.path.join(self._name, GENERATION_MARKER), str(generation))])
+
+    @property
+    def member_paths(self) -> Dict[str, GroupMember]:
+        """The members by their relative path"""
+        return OrderedDict([(os.path.join(self._name, config.name), config) for config in self._configs.values()])
+
+    def _select_location(self, paths: Dict[str, GroupMember], probes: Iterable[Set[str]]) -> Set[str]:
+        """Score the locations by the probe results and set the winner location
+
+        Returns:
+            the found paths of the winner location, or None if there is no acceptable location
+        """
         locations = self._transport.locations
         exists_reward = len(self._configs) + 1
         location_points = [0 for l in locations]
@@ -84,42 +155,245 @@ class Group(ConfigBase):
 
         logger.debug("Minimum points to accept a location: %s", min_points)
 
-        for idx, location in enumerate(locations):
-            for config in self._configs.values():
-                relpath = os.path.join(self._name, config.name)
-                location.init_for(relpath)
-                exists = location.check(relpath)
-                if exists:
+        max_points = exists_reward * len(paths)
+        found_paths = []
+
+        for idx, found in enumerate(probes):
+            found_paths.append(found)
+            for path, config in paths.items():
+                if path in found:
                     location_points[idx] += exists_reward
                 elif not config.mandatory:
                     location_points[idx] += 1
+            if location_points[idx] == max_points:
+                # the first location with all the members cannot be beaten by the next ones
+                break
 
         logger.debug("Group load: location points: %s", location_points)
 
         max_point = max(location_points)
         if max_point < min_points:
             logger.debug("Group load: target not found")
-            return False
+            return None
 
-        self._location = locations[location_points.index(max_point)]
+        location_idx = location_points.index(max_point)
+        self._location = locations[location_idx]
 
         logger.info("Group load: found location: %s", self._location)
 
-        for config in self._configs.values():
-            path = os.path.join(self._name, config.name)
+        return found_paths[location_idx]
+
+    def load(self) -> bool:
+        logger.debug("Group load: with %s", list(self._configs.values()))
+        self._transport.init_for(self._name)
+        paths = self.member_paths
+
+        found = self._select_location(paths, self._transport.probe(list(paths)))
+        if found is None:
+            return False
+
+        self._found = found
+        self._fingerprints.clear()
+        self._run_consistent(lambda: self._load_members(paths, found))
+        return True
+
+    def reload(self) -> List[GroupMember]:
+        """Load the changed members only
+
+        A member is reloaded if the stat of its file differs from its fingerprint (and the hash of the content too if hash_content is
+        set). The locations are scored again only if the set of the member files of the location has changed. If the group has
+        not been loaded yet, it is loaded.
+
+        Returns:
+            the changed members: the reloaded, the new and the removed ones
+        """
+        if self._location is None:
+            return [config for path, config in self.member_paths.items() if path in self._found] if self.load() else []
+
+        paths = self.member_paths
+        found = self._location.probe(list(paths))
+
+        if found != self._found:
+            logger.debug("Group reload: member files changed (%s -> %s), select location again", self._found, found)
+            location = self._location
+            self._transport.init_for(self._name)
+            found = self._select_location(paths, self._transport.probe(list(paths)))
+            if found is None:
+                logger.warning("Group reload: group '%s' is not found anymore, keep the loaded data", self._name)
+                return []
+            if self._location is not location:
+                self._fingerprints.clear()
+
+        changed = []
+
+        for path in self._found - found:
+            logger.debug("Group reload: %s has been removed", path)
+            self._fingerprints.pop(path, None)
+            paths[path]._unload()
+            changed.append(paths[path])
+
+        self._found = found
+
+        def reload_members():
+            for config in self._load_members(paths, found):
+                if config not in changed:
+                    changed.append(config)
+
+        self._run_consistent(reload_members)
+        return changed
+
+    def _run_consistent(self, func: Callable):
+        """Run the member loader function, in transactional mode repeat it until there is no switch-over meanwhile"""
+        if not self._transactional:
+            return func()
+
+        for _ in range(self._max_retries):
+            generation = self.read_generation()
+            if generation % 2 == 0:
+                res = func()
+                if self.read_generation() == generation:
+                    self._generation = generation
+                    return res
+            logger.debug("Group load: switch-over in progress (generation: %s), retry", generation)
+            time.sleep(self._retry_delay)
+
+        raise GroupException("Switch-over of group '{}' did not finish in {} attempts".format(self._name, self._max_retries))
+
+    def _load_members(self, paths: Dict[str, GroupMember], found: Set[str]) -> List[GroupMember]:
+        """Load the found members which are changed since their fingerprint (all of them if there is no fingerprint)"""
+        loaded = []
+        for path, config in paths.items():
             config._update(self._name, self._location)
-            if self._location.check(path):
-                config.load()
+            if path in found:
+                if self._load_member(path, config):
+                    loaded.append(config)
             else:
                 logger.debug("Group load: %s data not found (optional)", config.name)
-
+        return loaded
+
+    def _stat_member(self, config: GroupMember) -> tuple:
+        try:
+            return stat_key(os.stat(config.path))
+        except OSError:
+            return None
+
+    def _load_member(self, path: str, config: GroupMember) -> bool:
+        previous = self._fingerprints.get(path)
+        if previous is not None:
+            # only the reload stats the path, the fingerprint itself comes from the fstat of the read (taken before the read, so a
+            # change during the read is detected by the next reload)
+            key = self._stat_member(config)
+            if key is not None and previous.stat == key:
+                return False
+
+        if not self._hash_content:
+            self._fingerprints[path] = Fingerprint(config._load_with_key(), None)
+            return True
+
+        raw_data, key = self._location.read_with_key(config.relpath)
+        digest = hashlib.sha1(raw_data.encode('utf-8')).hexdigest()
+        self._fingerprints[path] = Fingerprint(key, digest)
+        if previous is not None and previous.digest == digest:
+            logger.debug("Group reload: %s is touched but not modified", path)
+            return False
+        config.process_data(raw_data)
         return True
 
+    async def aload(self) -> bool:
+        """awaitable load, the members are read concurrently"""
+        import asyncio
+
+        logger.debug("Group aload: with %s", list(self._configs.values()))
+        await self._transport.ainit_for(self._name)
+        paths = self.member_paths
+
+        found = self._select_location(paths, await self._transport.aprobe(list(paths)))
+        if found is None:
+            return False
+
+        self._found = found
+        self._fingerprints.clear()
+
+        if not self._transactional:
+            await self._aload_members(paths, found)
+            return True
+
+        for _ in range(self._max_retries):
+            generation = await run_blocking(self.read_generation)
+            if generation % 2 == 0:
+                await self._aload_members(paths, found)
+                if await run_blocking(self.read_generation) == generation:
+                    self._generation = generation
+                    return True
+            logger.debug("Group aload: switch-over in progress (generation: %s), retry", generation)
+            await asyncio.sleep(self._retry_delay)
+
+        raise GroupException("Switch-over of group '{}' did not finish in {} attempts".format(self._name, self._max_retries))
+
+    async def _aload_members(self, paths: Dict[str, GroupMember], found: Set[str]):
+        import asyncio
+
+        loaders = []
+        for path, config in paths.items():
+            config._update(self._name, self._location)
+            if path in found:
+                loaders.append(self._aload_member(path, config))
+            else:
+                logger.debug("Group aload: %s data not found (optional)", config.name)
+
+        await asyncio.gather(*loaders)
+
+    async def _aload_member(self, path: str, config: GroupMember):
+        self._fingerprints[path] = Fingerprint(await config._aload_with_key(), None)
+
+    def _watched_files(self) -> Dict[str, GroupMember]:
+        return OrderedDict([(config.path, config) for config in self._configs.values()])
+
+    def _reload_files(self, configs: List[GroupMember]) -> List[GroupMember]:
+        return self.reload()
+
     def dump(self, location: Location = None) -> bool:
+        if self._transactional:
+            return self._transactional_dump(location or self._location)
+
         for config in self._configs.values():
             config._update(self._name)
             config._direct_dump(location or self._location)
 
+    def _transactional_dump(self, location: Location) -> bool:
+        staged = []
+        try:
+            for config in self._configs.values():
+                config._update(self._name)
+                staged.append(location.stage(config.relpath, config.serialize_to))
+        except BaseException:
+            location.discard(staged)
+            raise
+
+        generation = self.read_generation(location)
+        # an odd generation means a previous switch-over has been interrupted
+        generation += generation % 2
+
+        logger.debug("Group dump: switch-over to generation %s", generation + 2)
+
+        self._write_generation(location, generation + 1)
+        location.commit(staged)
+        self._write_generation(location, generation + 2)
+
+        self._generation = generation + 2
+        return True
+
+    async def adump(self, location: Location = None) -> bool:
+        import asyncio
+
+        if self._transactional:
+            return await run_blocking(self._transactional_dump, location or self._location)
+
+        dumpers = []
+        for config in self._configs.values():
+            config._update(self._name)
+            dumpers.append(config._direct_adump(location or self._location))
+        await asyncio.gather(*dumpers)
 
     def __repr__(self):
         return "<Group name={}, transport={}, members={}".format(self.name, self._transport.__class__.__name__, list(self.members.values()))
@@ -0,0 +1,50 @@
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+Event = namedtuple('Event', ['stage', 'name', 'size', 'duration'])
+Event.__doc__ = """Timed event of a stage of the load/dump pipeline
+
+Args:
+    stage: init_for, probe, check, read, deserialize, serialize or write
+    name: the config name or the relative path of the file
+    size: length of the data in characters (bytes for the bytes read path), number of the found files for probe, None if not relevant
+    duration: seconds
+"""
+
+# replaced (not mutated) on change, so the emitters can iterate it without lock
+_observers = ()
+
+def add_observer(observer: Callable[[Event], None]):
+    """Register a function to call with every Event, in the thread of the stage"""
+    global _observers
+    _observers = _observers + (observer, )
+
+def remove_observer(observer: Callable[[Event], None]):
+    global _observers
+    _observers = tuple(item for item in _observers if item is not observer)
+
+@contextmanager
+def observe(observer: Callable[[Event], None]):
+    """Register the observer for the with block"""
+    add_observer(observer)
+    try:
+        yield observer
+    finally:
+        remove_observer(observer)
+
+def start() -> float:
+    """Start the timing of a stage, gives back None if there is no observer, then the stage must not call the emit"""
+    return perf_counter() if _observers else None
+
+def emit(stage: str, name: str, size: int, started: float):
+    event = Event(stage, name, size, perf_counter() - started)
+    for observer in _observers:
+        try:
+            observer(event)
+        except Exception:
+            logger.exception("Observer %r failed on %s", observer, event)
@@ -0,0 +1,139 @@
+import logging
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable
+
+from configpp.soil.config import ConfigBase
+from configpp.soil.exception import SoilException
+from configpp.soil.utils import create_from_url, normalize_url
+
+logger = logging.getLogger(__name__)
+
+class RegistryEntry():
+
+    def __init__(self, url: str):
+        self.url = url
+        self.config = None  # type: ConfigBase
+        self.refcount = 0
+        self.lock = Lock()
+
+class RegistryHandle():
+    """One acquire of a registry entry, the release always goes to the acquired entry even if the url has been invalidated since"""
+
+    def __init__(self, registry: 'ConfigRegistry', entry: RegistryEntry):
+        self._registry = registry
+        self._entry = entry
+        self._released = False
+
+    @property
+    def config(self) -> ConfigBase:
+        return self._entry.config
+
+    @property
+    def url(self) -> str:
+        return self._entry.url
+
+    def release(self):
+        """Release the acquire, the second call does nothing"""
+        with self._registry._lock:
+            if self._released:
+                return
+            self._released = True
+        self._registry._release(self._entry)
+
+class ConfigRegistry():
+    """Shared, loaded config handlers by url
+
+    The urls are normalised (see normalize_url), so the different forms of the same config url give the same handler. The handler is
+    created and loaded at the first acquire, the concurrent first acquires wait for the load instead of loading it again. The
+    handler is dropped when its last user releases it or on invalidate; the current users can keep using the dropped handler, but
+    the next acquire creates and loads a new one. The release by url always goes to the current handler of the url, so the code
+    which can run across an invalidate should use the handles of the acquire_handle (or the use) instead.
+
+    Args:
+        factory: creates the handler from the normalised url
+    """
+
+    def __init__(self, factory: Callable[[str], ConfigBase] = create_from_url):
+        self._factory = factory
+        self._entries = {}  # type: Dict[str, RegistryEntry]
+        self._lock = Lock()
+
+    def acquire(self, url: str) -> ConfigBase:
+        """Give back the shared loaded handler of the url and increment its reference count
+
+        Raises:
+            SoilException: if the config is not found
+        """
+        return self.acquire_handle(url).config
+
+    def acquire_handle(self, url: str) -> RegistryHandle:
+        """Acquire the shared loaded handler of the url like the acquire, the returned handle releases exactly this acquire
+
+        Raises:
+            SoilException: if the config is not found
+        """
+        url = normalize_url(url)
+
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                entry = self._entries[url] = RegistryEntry(url)
+            entry.refcount += 1
+
+        try:
+            with entry.lock:
+                if entry.config is None:
+                    config = self._factory(url)
+                    if not config.load():
+                        raise SoilException("Config not found for url '{}'".format(url))
+                    logger.debug("Registry: loaded %s", url)
+                    entry.config = config
+                return RegistryHandle(self, entry)
+        except BaseException:
+            self._release(entry)
+            raise
+
+    @contextmanager
+    def use(self, url: str):
+        """Acquire the handler of the url for the with block"""
+        handle = self.acquire_handle(url)
+        try:
+            yield handle.config
+        finally:
+            handle.release()
+
+    def release(self, url: str):
+        """Decrement the reference count of the current handler of the url, drop the handler if it is not used anymore"""
+        url = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is None:
+            raise SoilException("Url '{}' is not acquired".format(url))
+        self._release(entry)
+
+    def _release(self, entry: RegistryEntry):
+        with self._lock:
+            entry.refcount -= 1
+            if entry.refcount <= 0 and self._entries.get(entry.url) is entry:
+                del self._entries[entry.url]
+
+    def invalidate(self, url: str = None):
+        """Drop the handler of the url (or every handler if url is None), so the next acquire loads the config again"""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(normalize_url(url), None)
+
+    def refcount(self, url: str) -> int:
+        with self._lock:
+            entry = self._entries.get(normalize_url(url))
+            return 0 if entry is None else entry.refcount
+
+    def __contains__(self, url: str):
+        with self._lock:
+            entry = self._entries.get(normalize_url(url))
+            return entry is not None and entry.config is not None
+
+process_registry = ConfigRegistry()
@@ -1,9 +1,13 @@
 import os
 import logging
 import json
+import re
+import threading
 from abc import ABC, abstractmethod
 from collections import OrderedDict
-from ruamel import yaml
+from functools import lru_cache
+from io import StringIO
+from typing import Dict, TextIO
 
 from configpp.soil.exception import SoilException
 
@@ -24,6 +28,11 @@ def extensions(*args):
 class TransformBase(ABC):
     """Base class for the different serializing methods, eg json or yaml"""
 
+    @property
+    def cache_key(self):
+        """Identifies the format of the deserialized data in the ReadCache"""
+        return type(self)
+
     @abstractmethod
     def serialize(self, data):
         """Make string from python data
@@ -46,27 +55,264 @@ class TransformBase(ABC):
             any serializable python type
         """
 
+    def deserialize_bytes(self, data):
+        """Make python type from utf-8 encoded bytes-like data, eg a memory mapped file
+
+        The default implementation decodes the data into string, the transforms override it if their backend can parse the buffer
+        directly. The buffer must not be referenced after the return.
+
+        Args:
+            data: bytes or mmap
+
+        Returns:
+            any serializable python type
+        """
+        return self.deserialize(str(data, 'utf-8'))
+
+    def serialize_to(self, data, stream: TextIO):
+        """Write the serialized data into a text stream, without building the whole string if the format supports it
+
+        Args:
+            data: any serializable python type
+            stream: writable text file object
+        """
+        stream.write(self.serialize(data))
+
+class JSONBackend():
+    """Encoder and/or decoder functions of a json library
+
+    The encoder must give exactly the same output as the json.dumps with the default arguments, because it changes the content of
+    the dumped files. The decoder must give back the same plain python types as json.loads.
+
+    Args:
+        name: name of the backend
+        dumps: encoder function, None if the library has no conforming one
+        loads: decoder function, None if the library has no conforming one
+        loads_buffer: the decoder accepts any bytes-like object (eg memoryview) besides str
+    """
+
+    def __init__(self, name: str, dumps = None, loads = None, loads_buffer = False):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+        self.loads_buffer = loads_buffer
+
+    def __repr__(self):
+        return "<JSONBackend name={}, dumps={}, loads={}>".format(self.name, self.dumps is not None, self.loads is not None)
+
+# the integers out of the 64 bit range have at least 19 digits
+_long_number_str = re.compile(r'\d{19}')
+_long_number_bytes = re.compile(br'\d{19}')
+
+def _create_orjson_backend():
+    import orjson
+
+    def loads(data):
+        # orjson turns the big integers into float and rejects the NaN, the Infinity and the lone surrogates, which are valid for the
+        # stdlib, so these documents (and the ones with any long digit run) are decoded by the stdlib to get the same data
+        long_number = _long_number_str if isinstance(data, str) else _long_number_bytes
+        if long_number.search(data) is None:
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                pass
+        return json.loads(data if isinstance(data, str) else str(data, 'utf-8'))
+
+    # orjson.dumps has no option for the separators of the stdlib, so only its decoder is used
+    return JSONBackend('orjson', loads = loads, loads_buffer = True)
+
+def _create_stdlib_backend():
+    return JSONBackend('json', dumps = json.dumps, loads = json.loads)
+
+# the first installed one is the default, the others are opt-in by the backend argument of the JSONTransform
+_json_backend_factories = [_create_stdlib_backend, _create_orjson_backend]
+
+_json_backends = None  # type: Dict[str, JSONBackend]
+
+def get_json_backends() -> Dict[str, JSONBackend]:
+    """The installed json backends in preference order
+
+    They are created at the first use, so the json libraries are not imported with configpp.
+    """
+    global _json_backends
+    if _json_backends is None:
+        backends = OrderedDict()
+        for create_backend in _json_backend_factories:
+            try:
+                backend = create_backend()
+            except ImportError:
+                continue
+            backends[backend.name] = backend
+        _json_backends = backends
+        _select_json_backends()
+    return _json_backends
+
+def register_json_backend(backend: JSONBackend, first = True):
+    """Register a json backend, the first (installed) one is the preferred"""
+    backends = get_json_backends()
+    backends[backend.name] = backend
+    if first:
+        backends.move_to_end(backend.name, last = False)
+    _select_json_backends()
+
+def get_json_backend(name: str) -> JSONBackend:
+    backends = get_json_backends()
+    if name not in backends:
+        raise TransformException("Unknown json backend: '{}', the available ones: {}".format(name, list(backends)))
+    return backends[name]
+
+def _select_json_backends():
+    global _json_encoder, _json_decoder
+    _json_encoder = next((backend for backend in _json_backends.values() if backend.dumps is not None), None)
+    _json_decoder = next((backend for backend in _json_backends.values() if backend.loads is not None), None)
+
 @extensions('json')
 class JSONTransform(TransformBase):
-    """Transform for json formatted data"""
+    """Transform for json formatted data
+
+    Args:
+        ordered: decode the objects into OrderedDict. The object pairs hook needs the stdlib decoder, so drop it if the order of the
+            keys doesn't matter (or the plain dicts are ordered enough)
+        backend: name of the json backend, eg 'orjson' for the faster decoding of the big files. The stdlib is used by default (and
+            for the missing half of the backend).
+    """
+
+    def __init__(self, ordered = True, backend: str = None):
+        get_json_backends()
+        self._ordered = ordered
+        self._encoder = _json_encoder
+        self._decoder = _json_decoder
+        if backend is not None:
+            selected = get_json_backend(backend)
+            self._encoder = selected if selected.dumps is not None else _json_encoder
+            self._decoder = selected if selected.loads is not None else _json_decoder
+
+    @property
+    def cache_key(self):
+        return (type(self), self._ordered)
+
+    @property
+    def ordered(self) -> bool:
+        return self._ordered
 
     def serialize(self, data):
-        return json.dumps(data)
+        return self._encoder.dumps(data)
 
     def deserialize(self, data: str):
-        return json.loads(data, object_pairs_hook = OrderedDict)
+        if self._ordered:
+            return json.loads(data, object_pairs_hook = OrderedDict)
+        return self._decoder.loads(data)
+
+    def deserialize_bytes(self, data):
+        if self._ordered or not self._decoder.loads_buffer:
+            return super().deserialize_bytes(data)
+        with memoryview(data) as view:
+            return self._decoder.loads(view)
+
+# the yaml libraries are imported at the first use of the yaml transforms
+
+@lru_cache(maxsize = None)
+def _round_trip_representer() -> type:
+    from ruamel.yaml.representer import RoundTripRepresenter
+
+    class _RoundTripRepresenter(RoundTripRepresenter):
+        pass
+
+    # registered on the subclass to keep the representers of ruamel itself untouched
+    _RoundTripRepresenter.add_representer(OrderedDict, _RoundTripRepresenter.represent_dict)
+    return _RoundTripRepresenter
+
+def create_yaml_engine():
+    from ruamel.yaml import YAML
+
+    engine = YAML(typ = 'rt')
+    engine.Representer = _round_trip_representer()
+    engine.default_flow_style = False
+    return engine
 
 @extensions('yaml', 'yml')
 class YamlTransform(TransformBase):
+    """Round-trip yaml transform, keeps the comments and the formatting of the loaded data
+
+    The ruamel engines are not thread safe, so every thread gets its own one, built on the first use.
+    """
 
     # very big TODO: mintha a default_flow_style-nak nem lenne hatasa... (test_write_config_file_after_nth_revision_created_with_new_config)
 
+    _local = threading.local()
+
+    @property
+    def engine(self):
+        engine = getattr(self._local, 'engine', None)
+        if engine is None:
+            engine = self._local.engine = create_yaml_engine()
+        return engine
+
     def serialize(self, data):
-        yaml.representer.RoundTripRepresenter.add_representer(OrderedDict, yaml.representer.RoundTripRepresenter.represent_dict)
-        return yaml.dump(data, Dumper = yaml.RoundTripDumper, default_flow_style = False)
+        stream = StringIO()
+        self.engine.dump(data, stream)
+        return stream.getvalue()
+
+    def serialize_to(self, data, stream: TextIO):
+        self.engine.dump(data, stream)
 
     def deserialize(self, data: str):
-        return yaml.load(data, Loader = yaml.RoundTripLoader)
+        return self.engine.load(data)
+
+
+@lru_cache(maxsize = None)
+def _safe_representer() -> type:
+    from ruamel.yaml.representer import SafeRepresenter
+
+    class _SafeRepresenter(SafeRepresenter):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # the C dumper builds the representer itself, so the key order can be kept only here
+            self.sort_base_mapping_type_on_output = False
+
+    _SafeRepresenter.add_representer(OrderedDict, _SafeRepresenter.represent_dict)
+    return _SafeRepresenter
+
+def create_fast_yaml_engine():
+    from ruamel.yaml import YAML
+
+    engine = YAML(typ = 'safe')
+    engine.Representer = _safe_representer()
+    engine.default_flow_style = False
+    return engine
+
+class FastYamlTransform(TransformBase):
+    """Read optimised yaml transform
+
+    Uses the safe engine of ruamel (the libyaml based C loader of ruamel.yaml.clib if present), which follows the same yaml 1.2
+    rules as the YamlTransform, but gives back plain python types, so the comments and the formatting are lost on dump. Use the
+    YamlTransform for the tools that edit the files.
+    """
+
+    _local = threading.local()
+
+    @property
+    def engine(self):
+        engine = getattr(self._local, 'engine', None)
+        if engine is None:
+            engine = self._local.engine = create_fast_yaml_engine()
+        return engine
+
+    def serialize(self, data):
+        stream = StringIO()
+        self.engine.dump(data, stream)
+        return stream.getvalue()
+
+    def serialize_to(self, data, stream: TextIO):
+        self.engine.dump(data, stream)
+
+    def deserialize(self, data: str):
+        return self.engine.load(data)
+
+    def deserialize_bytes(self, data):
+        # the C loader reads the mmap like a file, in chunks, and detects the encoding of the bytes itself
+        return self.deserialize(data)
 
 
 def guess_transform_for_file(filename, default = None):
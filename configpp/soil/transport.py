@@ -1,13 +1,107 @@
+import binascii
 import logging
+import mmap
 import os
-from typing import List
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, TimeoutError, wait as wait_futures
+from io import StringIO
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterator, List, Set, TextIO, Tuple
+
+from configpp.soil import instrument
+from configpp.soil.aio import run_blocking
+from configpp.soil.cache import ReadCache, stat_key
 
 logger = logging.getLogger(__name__)
 
+class Durability():
+    """Describes how the Location should write the files
+
+    Args:
+        atomic: write into a temp file next to the target and replace the target with it, so the readers never see a partial file
+        fsync: fsync the temp file before the replace (the target itself if not atomic)
+        fsync_dir: fsync the folder after the replace, so the rename itself survives a crash too
+    """
+
+    def __init__(self, atomic = True, fsync = True, fsync_dir = False):
+        self.atomic = atomic
+        self.fsync = fsync
+        self.fsync_dir = fsync_dir
+
+    def __repr__(self):
+        return "<Durability atomic={}, fsync={}, fsync_dir={}>".format(self.atomic, self.fsync, self.fsync_dir)
+
+class StagedWrite():
+    """A file written into a temp path, waiting for the Location.commit"""
+
+    def __init__(self, target: str, temp_path: str):
+        self.target = target
+        self.temp_path = temp_path
+
+def write_data(stream: TextIO, data) -> int:
+    """Write the data of the Location.write and stage into the stream
+
+    Args:
+        data: the string to write or a function which writes into the stream itself, eg a bound Config.serialize_to
+
+    Returns:
+        the size of the written data
+    """
+    if callable(data):
+        data(stream)
+        return stream.tell()
+    stream.write(data)
+    return len(data)
+
+def fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 class Location():
+    """A folder in the file system to search the configs in
 
-    def __init__(self, base_path: str):
+    Args:
+        base_path: the folder
+        cache: optional ReadCache for the reads
+        durability: how to write the files, if None the files are overwritten in place
+        mmap_threshold: load the configs through the bytes read path and memory map the files not smaller than this size in bytes.
+            If None the configs are read as text.
+    """
+
+    def __init__(self, base_path: str, cache: ReadCache = None, durability: Durability = None, mmap_threshold: int = None):
         self._base_path = base_path
+        self._cache = cache
+        self._durability = durability
+        self._mmap_threshold = mmap_threshold
+
+    @property
+    def cache(self) -> ReadCache:
+        return self._cache
+
+    @cache.setter
+    def cache(self, value: ReadCache):
+        self._cache = value
+
+    @property
+    def durability(self) -> Durability:
+        return self._durability
+
+    @durability.setter
+    def durability(self, value: Durability):
+        self._durability = value
+
+    @property
+    def mmap_threshold(self) -> int:
+        return self._mmap_threshold
+
+    @mmap_threshold.setter
+    def mmap_threshold(self, value: int):
+        self._mmap_threshold = value
 
     def init_for(self, path: str):
         pass
@@ -20,50 +114,371 @@ class Location():
         return os.path.join(self._base_path, path)
 
     def check(self, path: str):
-        return os.path.isfile(self.target_path(path))
+        started = instrument.start()
+        res = os.path.isfile(self.target_path(path))
+        if started is not None:
+            instrument.emit('check', path, None, started)
+        return res
+
+    def list_dir(self, folder: str) -> Set[str]:
+        """Gives back the names of the files in the folder
+
+        The type of the entries comes from the directory listing (scandir), so it does not cost a stat call on most file systems.
+        """
+        try:
+            return set(entry.name for entry in os.scandir(self.target_path(folder)) if entry.is_file())
+        except OSError:
+            return set()
+
+    def probe(self, paths: List[str]) -> Set[str]:
+        """Gives back the paths which are exist as file in this location
+
+        Every folder is listed only once, the files found in the listing are not checked again, so neither the found nor the
+        missing files cost a stat call.
+        """
+        folders = OrderedDict()  # type: Dict[str, List[str]]
+        for path in paths:
+            folders.setdefault(os.path.dirname(path), []).append(path)
+
+        found = set()
+        for folder, folder_paths in folders.items():
+            # a lonely file is cheaper to check than to list its folder
+            if len(folder_paths) > 1:
+                listing = self.list_dir(folder)
+                found.update(path for path in folder_paths if os.path.basename(path) in listing)
+            else:
+                found.update(path for path in folder_paths if self.check(path))
+        return found
 
     def read(self, path: str):
-        with open(self.target_path(path)) as f:
-            return f.read()
+        started = instrument.start()
+        if self._cache is not None:
+            data = self._cache.read(self.target_path(path))
+        else:
+            with open(self.target_path(path)) as f:
+                data = f.read()
+        if started is not None:
+            instrument.emit('read', path, len(data), started)
+        return data
+
+    def read_with_key(self, path: str) -> Tuple[str, tuple]:
+        """Read the file like the read, with the stat_key of the read content
+
+        The key comes from the fstat of the opened file (or from the ReadCache), so it does not cost a stat call on the path, and it
+        belongs to the read content even if the file is replaced meanwhile.
+        """
+        started = instrument.start()
+        target = self.target_path(path)
+        if self._cache is not None:
+            data, key = self._cache.read_with_key(target)
+        else:
+            with open(target) as f:
+                key = stat_key(os.fstat(f.fileno()))
+                data = f.read()
+        if started is not None:
+            instrument.emit('read', path, len(data), started)
+        return data, key
+
+    @contextmanager
+    def open_buffer(self, path: str):
+        """Open the file for the bytes read path
+
+        The files not smaller than the mmap_threshold are memory mapped, so the pages of the file are used by the decoder directly
+        instead of copying them into a bytes and then decoding into a str. The buffer is closed at the end of the with block.
+
+        Yields:
+            bytes or mmap
+        """
+        with self.open_buffer_with_key(path) as (buffer, _):
+            yield buffer
+
+    @contextmanager
+    def open_buffer_with_key(self, path: str):
+        """Open the file like the open_buffer, with the stat_key of the opened file (see read_with_key)
+
+        Yields:
+            tuple of the buffer and the key
+        """
+        started = instrument.start()
+        with open(self.target_path(path), 'rb') as f:
+            st = os.fstat(f.fileno())
+            # an empty file cannot be mapped
+            if self._mmap_threshold is None or st.st_size < max(self._mmap_threshold, 1):
+                data = f.read()
+                if started is not None:
+                    instrument.emit('read', path, st.st_size, started)
+                yield data, stat_key(st)
+                return
+            with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as buffer:
+                if started is not None:
+                    instrument.emit('read', path, st.st_size, started)
+                yield buffer, stat_key(st)
 
     def remove(self, path: str) -> bool:
         target = self.target_path(path)
         if not os.path.isfile(target):
             return False
         os.remove(target)
+        if self._cache is not None:
+            self._cache.invalidate(target)
         return True
 
     def write(self, path: str, data) -> bool:
+        """Write the data into the file of the path
+
+        Args:
+            path: relative path of the file
+            data: string or writer function, see write_data. The writer streams into the temp file only with atomic durability,
+                the in place write runs it into a string first, so a failing writer does not truncate the file.
+        """
+        if self._durability is not None and self._durability.atomic:
+            self.commit([self.stage(path, data)])
+            return True
+        if callable(data):
+            buffer = StringIO()
+            data(buffer)
+            data = buffer.getvalue()
+        started = instrument.start()
         target = self.target_path(path)
         logger.debug("write data to '%s'", target)
         target_dir = os.path.dirname(target)
         if not os.path.exists(target_dir):
             os.makedirs(target_dir)
         with open(target, 'w') as f:
-            f.write(data)
+            size = write_data(f, data)
+            if self._durability is not None and self._durability.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if started is not None:
+            instrument.emit('write', path, size, started)
+        if self._cache is not None:
+            self._cache.invalidate(target)
         return True
 
+    def stage(self, path: str, data) -> StagedWrite:
+        """Write the data (string or writer function, see write_data) into a temp file next to the target, the target is not touched
+        until the commit"""
+        started = instrument.start()
+        target = self.target_path(path)
+        target_dir = os.path.dirname(target)
+        if not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+
+        temp_path = os.path.join(target_dir, '.{}.{}.tmp'.format(os.path.basename(target), binascii.hexlify(os.urandom(6)).decode()))
+        logger.debug("stage data for '%s' to '%s'", target, temp_path)
+
+        # with os.open the new file gets the same umask based permissions as the open(target, 'w') would give
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                size = write_data(f, data)
+                f.flush()
+                if self._durability is not None and self._durability.fsync:
+                    os.fsync(f.fileno())
+            if os.path.exists(target):
+                os.chmod(temp_path, os.stat(target).st_mode)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        if started is not None:
+            instrument.emit('write', path, size, started)
+        return StagedWrite(target, temp_path)
+
+    def commit(self, staged: List[StagedWrite]):
+        """Replace the targets with the staged files"""
+        for item in staged:
+            os.replace(item.temp_path, item.target)
+            logger.debug("write data to '%s'", item.target)
+            if self._cache is not None:
+                self._cache.invalidate(item.target)
+
+        if self._durability is not None and self._durability.fsync_dir:
+            for folder in set(os.path.dirname(item.target) for item in staged):
+                fsync_dir(folder)
+
+    def discard(self, staged: List[StagedWrite]):
+        for item in staged:
+            if os.path.exists(item.temp_path):
+                os.remove(item.temp_path)
+
+    # async protocol: the default implementations run the blocking versions in the executor of configpp.soil.aio
+
+    async def ainit_for(self, path: str) -> bool:
+        """Async version of init_for, gives back the valid property as well"""
+        return await run_blocking(_init_location, self, path)
+
+    async def aprobe(self, paths: List[str]) -> Set[str]:
+        return await run_blocking(self.probe, paths)
+
+    async def aread(self, path: str):
+        return await run_blocking(self.read, path)
+
+    async def aread_with_key(self, path: str) -> Tuple[str, tuple]:
+        return await run_blocking(self.read_with_key, path)
+
+    async def awrite(self, path: str, data) -> bool:
+        return await run_blocking(self.write, path, data)
+
+    async def aremove(self, path: str) -> bool:
+        return await run_blocking(self.remove, path)
+
     def __repr__(self):
         return "<Location: '{}'>".format(self._base_path)
 
+class ClimberIndex():
+    """Memo of the upward searches of the ClimberLocation instances
+
+    By default only the found base paths are kept: a memoized hit is used while its file exists (one isfile call instead of the
+    climbing), the misses are searched again every time, so a newly created file is found at the next lookup. A lonely name is
+    checked with isfile on every level, the folders are listed only for the searches of more names in the same folder. A file created
+    nearer to the start path than the memoized one is not noticed until the ttl or an invalidate call.
+
+    With cache_misses the folder listings and the misses are kept too, so every repeated lookup costs only a dict access, but
+    the new files are not found until the entries expire or the index is invalidated. An index can be shared between locations
+    (see process_climber_index).
+
+    Args:
+        ttl: seconds to keep an entry, forever if None
+        cache_misses: keep the listings and the misses too
+    """
+
+    def __init__(self, ttl: float = None, cache_misses = False):
+        self._ttl = ttl
+        self._cache_misses = cache_misses
+        self._listings = {}  # type: Dict[str, Tuple[float, Set[str]]]
+        self._found = {}  # type: Dict[Tuple[str, str], Tuple[float, str]]
+        self._lock = Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._listings.clear()
+            self._found.clear()
+
+    def _is_valid(self, entry: tuple) -> bool:
+        return self._ttl is None or time.monotonic() - entry[0] < self._ttl
+
+    def _is_usable(self, entry: tuple, path: str) -> bool:
+        if not self._is_valid(entry):
+            return False
+        if self._cache_misses:
+            return True
+        # the misses are not trusted, the hits only while their file exists
+        return entry[1] is not None and os.path.isfile(os.path.join(entry[1], path))
+
+    def _list_dir(self, folder: str, listings: dict) -> Set[str]:
+        with self._lock:
+            entry = listings.get(folder)
+        if entry is not None and self._is_valid(entry):
+            return entry[1]
+        try:
+            names = set(os.listdir(folder or os.curdir))
+        except OSError:
+            names = set()
+        with self._lock:
+            listings[folder] = (time.monotonic(), names)
+        return names
+
+    def find(self, start_path: str, paths: List[str]) -> Dict[str, str]:
+        """Search the nearest ancestor folder of the start_path for every path in one upward pass
+
+        Returns:
+            the found base path for every path (None if not found)
+        """
+        res = {}
+        missing = []
+        with self._lock:
+            entries = [(path, self._found.get((start_path, path))) for path in paths]
+        for path, entry in entries:
+            if entry is not None and self._is_usable(entry, path):
+                res[path] = entry[1]
+            else:
+                missing.append(path)
+
+        if not missing:
+            return res
+
+        # without cache_misses the listings are reused only in this search
+        listings = self._listings if self._cache_misses else {}
+        parts = start_path.split(os.sep)
+
+        for idx in range(len(parts), 0, -1):
+            try_base_path = os.sep.join(parts[:idx])
+            folders = OrderedDict()  # type: Dict[str, List[Tuple[str, str, str]]]
+            for path in missing:
+                if path not in res:
+                    target = os.path.join(try_base_path, path)
+                    folder, name = os.path.split(target)
+                    folders.setdefault(folder, []).append((path, target, name))
+            for folder, targets in folders.items():
+                # a lonely name is cheaper to check than to list its folder, unless the listings are kept
+                if len(targets) > 1 or self._cache_misses:
+                    listing = self._list_dir(folder, listings)
+                    targets = [item for item in targets if item[2] in listing]
+                for path, target, _ in targets:
+                    if os.path.isfile(target):
+                        res[path] = try_base_path
+            if len(res) == len(paths):
+                break
+
+        now = time.monotonic()
+        with self._lock:
+            for path in missing:
+                res.setdefault(path, None)
+                if res[path] is not None or self._cache_misses:
+                    self._found[(start_path, path)] = (now, res[path])
+
+        return res
+
+process_climber_index = ClimberIndex()
+
 class ClimberLocation(Location):
     """Climbs up in the folder tree from the start_path
 
-    TODO
+    The found paths are memoized in the index, which is private for the location by default. Use the process_climber_index to
+    share it in the whole process, or an index with cache_misses to memoize the misses too.
     """
 
-    def __init__(self, start_path: str = None):
-        super().__init__(start_path or os.getcwd())
+    def __init__(self, start_path: str = None, cache: ReadCache = None, index: ClimberIndex = None, durability: Durability = None,
+                 mmap_threshold: int = None):
+        super().__init__(start_path or os.getcwd(), cache, durability, mmap_threshold)
         self._found_path = None
+        self._index = index or ClimberIndex()
+
+    @property
+    def index(self) -> ClimberIndex:
+        return self._index
+
+    def invalidate(self):
+        self._index.invalidate()
 
     def init_for(self, path: str):
-        parts = self._base_path.split(os.sep)
+        found_path = self._index.find(self._base_path, [path])[path]
+        if found_path is not None:
+            self._found_path = found_path
 
-        for idx in range(len(parts), 0, -1):
-            try_base_path = os.sep.join(parts[:idx])
-            if os.path.isfile(os.path.join(try_base_path, path)):
-                self._found_path = try_base_path
-                break
+    def probe(self, paths: List[str]) -> Set[str]:
+        """Resolve all the paths in one upward pass, the nearest folder with any of the paths will be the found path"""
+        found_paths = self._index.find(self._base_path, paths)
+        bases = [base for base in found_paths.values() if base is not None]
+        if not bases:
+            return set()
+        self._found_path = max(bases, key = len)
+        return set(path for path, base in found_paths.items() if base == self._found_path)
+
+    def write(self, path: str, data) -> bool:
+        res = super().write(path, data)
+        self._index.invalidate()
+        return res
+
+    def remove(self, path: str) -> bool:
+        res = super().remove(path)
+        self._index.invalidate()
+        return res
+
+    def commit(self, staged: List[StagedWrite]):
+        super().commit(staged)
+        self._index.invalidate()
 
     @property
     def valid(self):
@@ -75,25 +490,163 @@ class ClimberLocation(Location):
     def __repr__(self):
         return "<ClimberLocation: {}>".format(self._found_path)
 
+def _run_future(previous: Future, future: Future, func: Callable, *args):
+    if previous is not None:
+        # one call at a time per location, the next call waits for the running one
+        wait_futures([previous])
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(func(*args))
+    except BaseException as e:
+        future.set_exception(e)
+
+def _init_location(location: Location, path: str) -> bool:
+    location.init_for(path)
+    return location.valid
+
+def _probe_location(location: Location, paths: List[str]) -> Set[str]:
+    started = instrument.start()
+    found = location.probe(paths)
+    if started is not None:
+        instrument.emit('probe', ', '.join(paths), len(found), started)
+    return found
+
 class Transport():
     """Make the connection with the file system
 
-    TODO
+    In concurrent mode the locations are probed at the same time in daemon threads, but the priority of the locations is kept: the
+    first location in the list wins, not the fastest one. The calls of a location run one at a time, a new call waits for the
+    running one (within its own probe_timeout). A location which cannot answer in probe_timeout seconds is skipped, and it is
+    skipped in the next calls too while its stuck call is running.
+
+    Args:
+        locations: the locations in priority order
+        env_var_name: unused
+        cache: ReadCache for the locations which have no cache yet
+        concurrent: probe the locations in threads
+        probe_timeout: seconds to wait for the locations in concurrent mode (None: wait forever)
+        durability: Durability for the locations which have no durability yet
+        mmap_threshold: mmap_threshold for the locations which have no one yet
     """
 
-    def __init__(self, locations: List[Location] = None, env_var_name = 'CONFIGPP_CONFIG_LOCATION'):
+    def __init__(self, locations: List[Location] = None, env_var_name = 'CONFIGPP_CONFIG_LOCATION', cache: ReadCache = None,
+                 concurrent = False, probe_timeout: float = None, durability: Durability = None, mmap_threshold: int = None):
         self._locations = locations or [
             # Location(os.getenv(env_var_name, '')), # 'Invalid location' error message is generated if env_var_name is not found
             Location(os.getcwd()),
             Location(os.path.expanduser('~')),
             Location('/etc'),
         ]
+        if cache is not None:
+            for location in self._locations:
+                if location.cache is None:
+                    location.cache = cache
+        if durability is not None:
+            for location in self._locations:
+                if location.durability is None:
+                    location.durability = durability
+        if mmap_threshold is not None:
+            for location in self._locations:
+                if location.mmap_threshold is None:
+                    location.mmap_threshold = mmap_threshold
+        self._concurrent = concurrent
+        self._probe_timeout = probe_timeout
+        # the last call of the locations by index, with the deadline of its caller
+        self._pending = {}  # type: Dict[int, Tuple[Future, float]]
+        self._pending_lock = Lock()
+
+    def _submit(self, idx: int, func: Callable, deadline: float, *args) -> Future:
+        """Run the func for the location in a new daemon thread, after the previous call of the location
+
+        Gives back None if the previous call of the location is still running after the deadline of its caller (eg a hung mount),
+        so the stuck calls do not pile up. The threads are daemons, so a stuck call does not block the exit of the interpreter.
+        """
+        with self._pending_lock:
+            previous, previous_deadline = self._pending.get(idx, (None, None))
+            if previous is not None and previous.done():
+                previous = None
+            if previous is not None and previous_deadline is not None and time.monotonic() > previous_deadline:
+                return None
+            future = Future()
+            self._pending[idx] = (future, deadline)
+
+        thread = Thread(target = _run_future, args = (previous, future, func, self._locations[idx]) + args, daemon = True,
+                        name = 'configpp-probe-{}'.format(idx))
+        thread.start()
+        return future
+
+    def _run(self, func: Callable, *args) -> Iterator:
+        """Call the func for every location, and gives back the results in the order of the locations
+
+        In concurrent mode the result is None for the locations that did not answer in time.
+        """
+        if not self._concurrent:
+            for location in self._locations:
+                yield func(location, *args)
+            return
+
+        deadline = None if self._probe_timeout is None else time.monotonic() + self._probe_timeout
+        futures = [self._submit(idx, func, deadline, *args) for idx in range(len(self._locations))]
+
+        for location, future in zip(self._locations, futures):
+            if future is None:
+                logger.warning("Location is stuck in a timed out call: %r", location)
+                yield None
+                continue
+            try:
+                yield future.result(None if deadline is None else max(0, deadline - time.monotonic()))
+            except TimeoutError:
+                logger.warning("Location did not answer in %s seconds: %r", self._probe_timeout, location)
+                yield None
 
     def init_for(self, path: str):
-        for location in self._locations:
-            location.init_for(path)
-            if not location.valid:
+        started = instrument.start()
+        for location, valid in zip(self._locations, self._run(_init_location, path)):
+            if not valid:
                 logger.error("Invalid location: %r", location)
+        if started is not None:
+            instrument.emit('init_for', path, None, started)
+
+    def probe(self, paths: List[str]) -> Iterator[Set[str]]:
+        """Gives back the found paths for every location in priority order, see Location.probe"""
+        for found in self._run(_probe_location, paths):
+            yield found or set()
+
+    def find(self, path: str) -> Location:
+        """Gives back the first location where the path exists, or None"""
+        for location, found in zip(self._locations, self.probe([path])):
+            if found:
+                return location
+        return None
+
+    async def _arun(self, coros: list) -> list:
+        """Await the coroutines of the locations concurrently, the result is None for the timed out ones"""
+        import asyncio
+
+        async def wait(location, coro):
+            try:
+                return await asyncio.wait_for(coro, self._probe_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Location did not answer in %s seconds: %r", self._probe_timeout, location)
+                return None
+        return await asyncio.gather(*[wait(location, coro) for location, coro in zip(self._locations, coros)])
+
+    async def ainit_for(self, path: str):
+        valids = await self._arun([location.ainit_for(path) for location in self._locations])
+        for location, valid in zip(self._locations, valids):
+            if not valid:
+                logger.error("Invalid location: %r", location)
+
+    async def aprobe(self, paths: List[str]) -> List[Set[str]]:
+        """Async version of probe, the locations are always probed concurrently"""
+        return [found or set() for found in await self._arun([location.aprobe(paths) for location in self._locations])]
+
+    async def afind(self, path: str) -> Location:
+        for location, found in zip(self._locations, await self.aprobe([path])):
+            if found:
+                return location
+        return None
 
     @property
     def locations(self):
@@ -104,5 +657,5 @@ class ClimberTransport(Transport):
     """Shorthand transport class to use ClimberLocation
     """
 
-    def __init__(self):
-        super().__init__([ClimberLocation()])
+    def __init__(self, cache: ReadCache = None, index: ClimberIndex = None, durability: Durability = None, mmap_threshold: int = None):
+        super().__init__([ClimberLocation(index = index)], cache = cache, durability = durability, mmap_threshold = mmap_threshold)
@@ -1,5 +1,7 @@
 
 import re
+from collections import namedtuple
+from functools import lru_cache
 from importlib import import_module
 
 from .group import Group, GroupMember
@@ -12,6 +14,9 @@ from .exception import SoilException
 class SoilUriParserException(SoilException):
     pass
 
+SPEC_CACHE_SIZE = 1024
+
+@lru_cache(maxsize = SPEC_CACHE_SIZE)
 def import_class(uri: str):
     parts = uri.split(':')
     if len(parts) != 2:
@@ -34,34 +39,77 @@ def parse_config_definition(definition: str):
 
     return name, transform_class, optional is None
 
-def create_from_url(url: str) -> ConfigBase:
-    """Create config handler instances from url
+_url_pattern = re.compile(r'configpp:\/\/([\w.\-:%&\?]+)(@[\w]+)?(/[\w.:]+)?(#[\w.:]+)?')
 
-    Example uris:
-        configpp://app.json
-        configpp://core.yaml%configpp.soil.transform:YamlTransform&logger.yaml%configpp.soil.transform:YamlTransform@app/configpp.soil.transport:Transport
-        configpp://core.yaml&logger.yaml@app
+def class_path(cls: type) -> str:
+    return '{}:{}'.format(cls.__module__, cls.__name__)
+
+MemberSpec = namedtuple('MemberSpec', ['name', 'transform_class', 'mandatory'])
+
+class ConfigSpec(namedtuple('ConfigSpec', ['members', 'group_name', 'transport_class'])):
+    """Immutable parsed form of a config url
+
+    Args:
+        members: tuple of MemberSpec, only one if the group_name is None
+        group_name: name of the group, None for a single config
+        transport_class: the transport to create
+    """
+
+    __slots__ = ()
+
+    @property
+    def url(self) -> str:
+        """The canonical url: every transform and the transport are explicit"""
+        defs = []
+        for member in self.members:
+            optional = '' if member.mandatory or self.group_name is None else '?'
+            defs.append('{}{}%{}'.format(member.name, optional, class_path(member.transform_class)))
+        return 'configpp://{}{}/{}'.format('&'.join(defs), '' if self.group_name is None else '@' + self.group_name,
+                                           class_path(self.transport_class))
+
+    def create(self) -> ConfigBase:
+        """Create new config handler instances"""
+        if self.group_name is None:
+            member = self.members[0]
+            return Config(member.name, member.transform_class(), self.transport_class())
+
+        members = [GroupMember(member.name, member.transform_class(), member.mandatory) for member in self.members]
+        return Group(self.group_name, members, self.transport_class())
+
+@lru_cache(maxsize = SPEC_CACHE_SIZE)
+def parse_url(url: str) -> ConfigSpec:
+    """Parse the url into ConfigSpec
+
+    The specs and the imported classes are cached, use parse_url.cache_clear and import_class.cache_clear if a module is reloaded.
     """
-    res = re.match(r'configpp:\/\/([\w.\-:%&\?]+)(@[\w]+)?(/[\w.:]+)?(#[\w.:]+)?', url)
+    res = _url_pattern.match(url)
     if not res:
         raise SoilUriParserException("Wrong uri format")
 
     config_defs, group_name, transport, _ = res.groups()
 
-    transport_class = import_class(transport) if transport else Transport
+    transport_class = import_class(transport[1:]) if transport else Transport
 
     if group_name:
+        members = tuple(MemberSpec(*parse_config_definition(config_def)) for config_def in config_defs.split('&'))
+        return ConfigSpec(members, group_name[1:], transport_class)
 
-        members = []
+    return ConfigSpec((MemberSpec(*parse_config_definition(config_defs)), ), None, transport_class)
 
-        for config_def in config_defs.split('&'):
+def normalize_url(url: str) -> str:
+    """Give back the canonical form of the url: every transform and the transport are explicit, the fragment is dropped
 
-            name, transform_class, mandatory = parse_config_definition(config_def)
-
-            members.append(GroupMember(name, transform_class(), mandatory))
+    The urls of the same configs have the same canonical form, eg configpp://app.json and
+    configpp://app.json%configpp.soil.transform:JSONTransform/configpp.soil.transport:Transport
+    """
+    return parse_url(url.strip()).url
 
-        return Group(group_name[1:], members, transport_class())
+def create_from_url(url: str) -> ConfigBase:
+    """Create config handler instances from url
 
-    else:
-        name, transform_class, _ = parse_config_definition(config_defs)
-        return Config(name, transform_class(), transport_class())
+    Example uris:
+        configpp://app.json
+        configpp://core.yaml%configpp.soil.transform:YamlTransform&logger.yaml%configpp.soil.transform:YamlTransform@app/configpp.soil.transport:Transport
+        configpp://core.yaml&logger.yaml@app
+    """
+    return parse_url(url).create()
@@ -0,0 +1,269 @@
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Set
+
+from configpp.soil.cache import stat_key
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+# the atomic writes of the Location replace the files, so the folders are watched, not the files
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_event_header = struct.Struct('iIII')
+
+class WatchBackend(ABC):
+    """Detects the changes of a set of files"""
+
+    def __init__(self, paths: Iterable[str]):
+        self._paths = set(paths)
+
+    @abstractmethod
+    def wait(self, timeout: float) -> Set[str]:
+        """Wait for changes at most timeout seconds
+
+        Returns:
+            the changed paths, empty if there was no change or the backend has been interrupted
+        """
+
+    @abstractmethod
+    def interrupt(self):
+        """Wake up the wait call from another thread"""
+
+    def close(self):
+        pass
+
+class PollingWatchBackend(WatchBackend):
+    """Compares the stat of the files in every interval
+
+    Args:
+        paths: the files to watch
+        interval: seconds between the checks
+    """
+
+    def __init__(self, paths: Iterable[str], interval: float = 1.):
+        super().__init__(paths)
+        self._interval = interval
+        self._interrupted = threading.Event()
+        self._stats = self._snapshot()
+
+    def _snapshot(self) -> Dict[str, tuple]:
+        stats = {}
+        for path in self._paths:
+            try:
+                stats[path] = stat_key(os.stat(path))
+            except OSError:
+                stats[path] = None
+        return stats
+
+    def wait(self, timeout: float) -> Set[str]:
+        # the debounce waits are shorter than the interval, but they need a fresh check too
+        if self._interrupted.wait(min(timeout, self._interval)):
+            return set()
+        stats = self._snapshot()
+        changed = set(path for path, key in stats.items() if self._stats[path] != key)
+        self._stats = stats
+        return changed
+
+    def interrupt(self):
+        self._interrupted.set()
+
+@lru_cache(maxsize = None)
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    import ctypes
+    import ctypes.util
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno = True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, 'inotify_init1') else None
+
+def inotify_available() -> bool:
+    return _load_libc() is not None
+
+def libc_errno() -> int:
+    import ctypes
+    return ctypes.get_errno()
+
+class InotifyWatchBackend(WatchBackend):
+    """Linux inotify based backend, called via ctypes
+
+    Args:
+        paths: the files to watch
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        super().__init__(paths)
+        libc = _load_libc()
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(libc_errno(), os.strerror(libc_errno()))
+        self._wake_r, self._wake_w = os.pipe()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._folders = {}  # type: Dict[int, str]
+        self._names = {}  # type: Dict[str, Set[str]]
+
+        for path in self._paths:
+            folder, name = os.path.split(path)
+            self._names.setdefault(folder, set()).add(name)
+
+        for folder in self._names:
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                logger.warning("Cannot watch folder '%s': %s", folder, os.strerror(libc_errno()))
+                continue
+            self._folders[wd] = folder
+
+    def _folder_paths(self, folder: str) -> Set[str]:
+        return set(os.path.join(folder, name) for name in self._names[folder])
+
+    def _parse(self, buffer: bytes) -> Set[str]:
+        changed = set()
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _event_header.unpack_from(buffer, offset)
+            offset += _event_header.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.debug("Inotify queue overflow, every file is considered as changed")
+                return set(self._paths)
+            folder = self._folders.get(wd)
+            if folder is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                changed.update(self._folder_paths(folder))
+            elif name in self._names[folder]:
+                changed.add(os.path.join(folder, name))
+        return changed
+
+    def wait(self, timeout: float) -> Set[str]:
+        ready, _, _ = select.select([self._fd, self._wake_r], [], [], timeout)
+        if self._wake_r in ready or self._fd not in ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            changed |= self._parse(buffer)
+        return changed
+
+    def interrupt(self):
+        # after the close the fd numbers can belong to other files already
+        with self._lock:
+            if not self._closed:
+                os.write(self._wake_w, b'\0')
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for fd in (self._fd, self._wake_r, self._wake_w):
+                os.close(fd)
+
+class Watcher():
+    """Watches files in a background thread and calls the handler with the changed ones
+
+    The changes are coalesced: after the first change the watcher waits until there is no new one for debounce seconds, then the
+    handler gets all of them at once. The handler runs in the thread of the watcher, its exceptions are logged.
+
+    Args:
+        paths: the files to watch
+        handler: function with one parameter, the set of the changed paths
+        debounce: seconds of silence to wait before calling the handler
+        poll_interval: seconds between the checks of the polling backend
+        use_inotify: use inotify if it is available, otherwise poll the stat of the files
+    """
+
+    def __init__(self, paths: Iterable[str], handler: Callable[[Set[str]], None], debounce: float = 0.2, poll_interval: float = 1.,
+                 use_inotify = True):
+        paths = list(paths)
+        if use_inotify and inotify_available():
+            self._backend = InotifyWatchBackend(paths)  # type: WatchBackend
+        else:
+            self._backend = PollingWatchBackend(paths, poll_interval)
+        self._handler = handler
+        self._debounce = debounce
+        self._poll_interval = poll_interval
+        self._stopped = threading.Event()
+        self._stop_lock = threading.Lock()
+        self._thread = threading.Thread(target = self._run, name = 'configpp-watcher', daemon = True)
+        self._thread.start()
+
+    @property
+    def backend(self) -> WatchBackend:
+        return self._backend
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def stop(self, timeout: float = None):
+        """Stop the watching and wait for the thread, it can be called more times (eg in and at the end of the with block)
+
+        The backend is closed by the thread of the watcher only.
+        """
+        with self._stop_lock:
+            if not self._stopped.is_set():
+                self._stopped.set()
+                self._backend.interrupt()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                changed = self._backend.wait(self._poll_interval)
+                if not changed:
+                    continue
+                deadline = time.monotonic() + self._debounce
+                while not self._stopped.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    more = self._backend.wait(remaining)
+                    if more:
+                        changed |= more
+                        deadline = time.monotonic() + self._debounce
+                if self._stopped.is_set():
+                    break
+                logger.debug("Changed files: %s", changed)
+                try:
+                    self._handler(changed)
+                except Exception:
+                    logger.exception("Watch handler failed for %s", changed)
+        finally:
+            self._backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __repr__(self):
+        return "<Watcher backend={}, running={}>".format(self._backend.__class__.__name__, self.running)
@@ -1,6 +1,32 @@
-from configpp.tree.tree import Tree
-from configpp.tree.items import NodeBase
-from configpp.tree.exceptions import ConfigTreeBuilderException
-from configpp.tree.item_factory import DictNodeFactory, LeafFactory
-from configpp.tree.settings import Settings
-from configpp.tree.custom_items import DatabaseLeaf, PythonLoggerLeaf
+import sys
+from importlib import import_module
+
+# the public names are imported from their modules at the first access (PEP 562)
+_exports = {
+    'Tree': 'tree',
+    'LoadResult': 'tree',
+    'NodeBase': 'items',
+    'ConfigTreeBuilderException': 'exceptions',
+    'DictNodeFactory': 'item_factory',
+    'LeafFactory': 'item_factory',
+    'Settings': 'settings',
+    'DatabaseLeaf': 'custom_items',
+    'PythonLoggerLeaf': 'custom_items',
+}
+
+__all__ = list(_exports)
+
+def __getattr__(name: str):
+    if name not in _exports:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    value = getattr(import_module('.' + _exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
+
+if sys.version_info < (3, 7):
+    # there is no module level __getattr__ before python 3.7
+    for _name in _exports:
+        __getattr__(_name)
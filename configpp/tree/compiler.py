@@ -0,0 +1,351 @@
+import logging
+from functools import partial
+from keyword import iskeyword
+from typing import List
+
+from voluptuous import UNDEFINED, Invalid, MultipleInvalid, Schema
+from voluptuous.error import DictInvalid, RequiredFieldInvalid, SequenceTypeInvalid, TypeInvalid, ValueInvalid
+
+from configpp.tree.item_factory import (MISSING, AttrNodeFactory, DictNodeFactory, DumpMethod, ItemFactoryBase, LeafFactory,
+                                        ListNodeFactory, collect_errors)
+from configpp.tree.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+def default_factory(value):
+    if callable(value):
+        return value
+    return lambda: value
+
+def is_plain_leaf(item: ItemFactoryBase, method_name: str):
+    return isinstance(item, LeafFactory) and getattr(type(item), method_name) is getattr(LeafFactory, method_name)
+
+def attribute_target(target: str, name: str):
+    if name.isidentifier() and not iskeyword(name):
+        return '{}.{}'.format(target, name), None
+    return None, 'setattr({}, {!r}, {{}})'.format(target, name)
+
+class CompiledItem():
+    """The generated load and dump functions of an item factory
+
+    Args:
+        load: function with voluptuous compiled validator signature (path, data)
+        dump: function to serialize the instance
+        source: the generated python source
+    """
+
+    def __init__(self, load, dump, source: str):
+        self._load = load
+        self.dump = dump
+        self.source = source
+
+    def load(self, data):
+        try:
+            return self._load([], data)
+        except MultipleInvalid:
+            raise
+        except Invalid as e:
+            raise MultipleInvalid([e])
+
+class NodeCompiler():
+    """Generates specialised python source for loading and dumping the items of a tree, then execs it
+
+    The generated load functions validate and construct the instances in one traversal, so the voluptuous schema of the node
+    factories is not used by them (the leaf validators are). The schema has to be built before compiling because the factories
+    collect their items in create_schema.
+    """
+
+    def __init__(self, settings: Settings):
+        self._settings = settings
+        self._lines = []  # type: List[str]
+        self._footer = []  # type: List[str]
+        self._names = {}  # type: Dict[int, int]
+        self._loaders = set()
+        self._namespace = {
+            'partial': partial,
+            'DumpMethod': DumpMethod,
+            'Invalid': Invalid,
+            'MultipleInvalid': MultipleInvalid,
+            'DictInvalid': DictInvalid,
+            'RequiredFieldInvalid': RequiredFieldInvalid,
+            'SequenceTypeInvalid': SequenceTypeInvalid,
+            'TypeInvalid': TypeInvalid,
+            'ValueInvalid': ValueInvalid,
+            'MISSING': MISSING,
+            'collect_errors': collect_errors,
+        }
+
+    def compile(self, root: ItemFactoryBase) -> CompiledItem:
+        idx = self._add_loader(root)
+        source = '\n'.join(self._lines + self._footer) + '\n'
+        logger.debug("Compiled tree source: \n%s", source)
+        exec(compile(source, '<configpp.tree compiled {}>'.format(root), 'exec'), self._namespace)
+        return CompiledItem(self._namespace['load_{}'.format(idx)], self._namespace['dump_{}'.format(idx)], source)
+
+    def _const(self, name: str, value) -> str:
+        self._namespace[name] = value
+        return name
+
+    def _get_index(self, item: ItemFactoryBase) -> int:
+        key = id(item)
+        if key not in self._names:
+            self._names[key] = len(self._names)
+            # hold a reference to the item so its id cannot be reused while compiling
+            self._const('item_{}'.format(self._names[key]), item)
+        return self._names[key]
+
+    def _add_loader(self, item: ItemFactoryBase) -> int:
+        idx = self._get_index(item)
+        if idx in self._loaders:
+            return idx
+        self._loaders.add(idx)
+
+        if isinstance(item, AttrNodeFactory):
+            self._emit_attr_node(idx, item)
+        elif isinstance(item, DictNodeFactory):
+            self._emit_dict_node(idx, item)
+        elif isinstance(item, ListNodeFactory):
+            self._emit_list_node(idx, item)
+        else:
+            self._emit_leaf(idx, item)
+
+        return idx
+
+    def _load_lines(self, item: ItemFactoryBase, path: str, value: str, target: str, indent: str) -> List[str]:
+        """Generate the lines which validate and construct the value into the target, or raise Invalid"""
+        if isinstance(item, (AttrNodeFactory, DictNodeFactory, ListNodeFactory)):
+            expr = 'load_{}({}, {})'.format(self._add_loader(item), path, value)
+            return [indent + target.format(expr)]
+
+        idx = self._get_index(item)
+        schema = item.create_schema()
+
+        if is_plain_leaf(item, 'process_value') and isinstance(schema, type):
+            type_name = self._const('type_{}'.format(idx), schema)
+            return [
+                indent + 'if isinstance({}, {}):'.format(value, type_name),
+                indent + '    ' + target.format(value),
+                indent + 'else:',
+                indent + '    raise TypeInvalid({!r}, {})'.format('expected %s' % schema.__name__, path),
+            ]
+
+        expr = '{}({}, {})'.format(self._const('validate_{}'.format(idx), Schema(schema)._compiled), path, value)
+        if not is_plain_leaf(item, 'process_value'):
+            expr = '{}({})'.format(self._const('process_{}'.format(idx), item.process_value), expr)
+        return [indent + target.format(expr)]
+
+    def _dump_expr(self, item: ItemFactoryBase, value: str) -> str:
+        if is_plain_leaf(item, 'dump'):
+            return value
+        if isinstance(item, (AttrNodeFactory, DictNodeFactory, ListNodeFactory)):
+            return 'dump_{}({})'.format(self._add_loader(item), value)
+        return '{}({})'.format(self._const('dump_leaf_{}'.format(self._get_index(item)), item.dump), value)
+
+    def _emit_leaf(self, idx: int, item: ItemFactoryBase):
+        lines = ['def load_{}(path, value):'.format(idx)]
+        lines += self._load_lines(item, 'path', 'value', 'return {}', '    ')
+        self._lines += lines + ['']
+        self._const('dump_{}'.format(idx), item.dump)
+
+    def _emit_attr_node(self, idx: int, item: AttrNodeFactory):
+        cls_name = self._const('cls_{}'.format(idx), item.instance_class)
+        keys_name = self._const('keys_{}'.format(idx), frozenset(item.attribute_map.values()))
+
+        lines = [
+            'def load_{}(path, value):'.format(idx),
+            '    if not isinstance(value, dict):',
+            "        raise DictInvalid('expected a dictionary', path)",
+            '    errors = []',
+            '    instance = {}()'.format(cls_name),
+        ]
+
+        dump_method_name = self._settings.dump_method_name_in_node_classes
+        if dump_method_name and item.compact:
+            # the compact class has a class level dump method, switch it to the compiled dump
+            self._footer.append('{}.{} = DumpMethod(dump_{})'.format(cls_name, dump_method_name, idx)
+                                if dump_method_name.isidentifier() and not iskeyword(dump_method_name) else
+                                'setattr({}, {!r}, DumpMethod(dump_{}))'.format(cls_name, dump_method_name, idx))
+        elif dump_method_name:
+            attr, setter = attribute_target('instance', dump_method_name)
+            expr = 'partial(dump_{}, instance)'.format(idx)
+            lines.append('    ' + ('{} = {}'.format(attr, expr) if attr else setter.format(expr)))
+
+        dump_items = []
+
+        for item_idx, (name, sub_item) in enumerate(item.items.items()):
+            key = item.attribute_map[name]
+            key_path = 'path + [{!r}]'.format(key)
+            attr, setter = attribute_target('instance', name)
+            target = attr + ' = {}' if attr else setter
+
+            lines.append('    val = value.get({!r}, MISSING)'.format(key))
+            if sub_item.default == UNDEFINED:
+                lines += [
+                    '    if val is MISSING:',
+                    "        errors.append(RequiredFieldInvalid('required key not provided', {}))".format(key_path),
+                    '    else:',
+                ]
+                indent = '        '
+            else:
+                default_name = self._const('default_{}_{}'.format(idx, item_idx), default_factory(sub_item.default))
+                lines += [
+                    '    if val is MISSING:',
+                    '        val = {}()'.format(default_name),
+                ]
+                indent = '    '
+
+            lines.append(indent + 'try:')
+            lines += self._load_lines(sub_item, key_path, 'val', target, indent + '    ')
+            lines += [
+                indent + 'except Invalid as e:',
+                indent + '    collect_errors(errors, e, {})'.format(key_path),
+            ]
+
+            dump_items.append('{!r}: {}'.format(key, self._dump_expr(sub_item, 'instance.' + name if attr else 'getattr(instance, {!r})'.format(name))))
+
+        lines += [
+            '    if not {}.issuperset(value):'.format(keys_name),
+            '        for key in value:',
+            '            if key not in {}:'.format(keys_name),
+            "                errors.append(Invalid('extra keys not allowed', path + [key]))",
+            '    if errors:',
+            '        raise MultipleInvalid(errors)',
+            '    return instance',
+            '',
+            'def dump_{}(instance):'.format(idx),
+            '    return {{{}}}'.format(', '.join(dump_items)),
+            '',
+        ]
+
+        self._lines += lines
+
+    def _emit_dict_node(self, idx: int, item: DictNodeFactory):
+        lines = [
+            'def load_{}(path, value):'.format(idx),
+            '    if not isinstance(value, dict):',
+            "        raise DictInvalid('expected a dictionary', path)",
+            '    errors = []',
+            '    res = {}',
+            '    for key, val in value.items():',
+        ]
+
+        if isinstance(item.key_type, type):
+            key_type_name = self._const('key_type_{}'.format(idx), item.key_type)
+            lines += [
+                '        if not isinstance(key, {}):'.format(key_type_name),
+                '            errors.append(TypeInvalid({!r}, path + [key]))'.format('expected %s' % item.key_type.__name__),
+                '            continue',
+                '        new_key = key',
+            ]
+        else:
+            key_validator_name = self._const('validate_key_{}'.format(idx), Schema(item.key_type)._compiled)
+            lines += [
+                '        try:',
+                '            new_key = {}(path + [key], key)'.format(key_validator_name),
+                '        except Invalid as e:',
+                '            errors.append(e)',
+                '            continue',
+            ]
+
+        lines.append('        try:')
+        lines += self._load_lines(item.item, 'path + [key]', 'val', 'res[new_key] = {}', '            ')
+        lines += [
+            '        except Invalid as e:',
+            '            collect_errors(errors, e, path + [key])',
+            '    if errors:',
+            '        raise MultipleInvalid(errors)',
+            '    return res',
+            '',
+            'def dump_{}(instance):'.format(idx),
+            '    return {{key: {} for key, val in instance.items()}}'.format(self._dump_expr(item.item, 'val')),
+            '',
+        ]
+
+        self._lines += lines
+
+    def _emit_list_node(self, idx: int, item: ListNodeFactory):
+        lines = [
+            'def load_{}(path, value):'.format(idx),
+            '    if not isinstance(value, list):',
+            "        raise SequenceTypeInvalid('expected a list', path)",
+        ]
+
+        if not item.items:
+            lines += [
+                '    if value:',
+                "        raise MultipleInvalid([ValueInvalid('not a valid value', path if path else value)])",
+                '    return []',
+                '',
+            ]
+            self._lines += lines
+            self._const('dump_{}'.format(idx), item.dump)
+            return
+
+        lines += [
+            '    errors = []',
+            '    res = []',
+            '    for idx, val in enumerate(value):',
+        ]
+
+        if len(item.items) == 1:
+            lines.append('        try:')
+            lines += self._load_lines(item.items[0], 'path + [idx]', 'val', 'res.append({})', '            ')
+            lines += [
+                '        except Invalid as e:',
+                '            if len(e.path) > len(path) + 1:',
+                '                raise',
+                '            errors.append(e)',
+            ]
+        else:
+            candidates = 'candidates_{}'.format(idx)
+            route = self._const('route_{}'.format(idx), item.route)
+            lines += [
+                '        route = {}(val)'.format(route),
+                '        if route is None:',
+            ]
+            if item.discriminator is None:
+                lines.append('            to_try = {}'.format(candidates))
+            else:
+                lines += [
+                    '            errors.append({}(path + [idx], val))'.format(self._const('tag_error_{}'.format(idx), item.tag_error)),
+                    '            continue',
+                ]
+            lines += [
+                '        else:',
+                '            to_try = ({}[route],)'.format(candidates),
+                '        invalid = None',
+                '        for candidate in to_try:',
+                '            try:',
+                '                res.append(candidate(path + [idx], val))',
+                '                break',
+                '            except Invalid as e:',
+                '                if len(e.path) > len(path) + 1:',
+                '                    raise',
+                '                invalid = e',
+                '        else:',
+                '            errors.append(invalid)',
+            ]
+
+        lines += [
+            '    if errors:',
+            '        raise MultipleInvalid(errors)',
+            '    return res',
+            '',
+        ]
+
+        if len(item.items) == 1:
+            lines += [
+                'def dump_{}(instance):'.format(idx),
+                '    return [{} for val in instance]'.format(self._dump_expr(item.items[0], 'val')),
+                '',
+            ]
+        else:
+            # the interpreted dump raises the proper exception for the multiple typed lists
+            self._const('dump_{}'.format(idx), item.dump)
+
+        self._lines += lines
+
+        if len(item.items) > 1:
+            # the candidate loaders has to be defined before the tuple is created
+            loaders = ['load_{}'.format(self._add_loader(sub_item)) for sub_item in item.items]
+            self._footer.append('{} = ({},)'.format(candidates, ', '.join(loaders)))
@@ -5,7 +5,6 @@ from datetime import datetime
 from enum import Enum
 from typing import List
 
-from dateutil.parser import parse
 from voluptuous import Any, Invalid, MatchInvalid
 
 from .item_factory import UNDEFINED, LeafFactory
@@ -15,6 +14,9 @@ from .items import LeafBase
 class DateTimeLeafFactory(LeafFactory):
 
     def create_schema(self):
+        # dateutil is imported only if there is a datetime leaf
+        from dateutil.parser import parse
+
         def validator(val):
             try:
                 return val if isinstance(val, datetime) else parse(val)
@@ -4,13 +4,41 @@ from functools import partial
 from re import finditer
 from typing import Dict, get_type_hints, List
 
-import typing_inspect
-from voluptuous import UNDEFINED, MultipleInvalid, Optional, Required, Schema
+from voluptuous import UNDEFINED, Invalid, MultipleInvalid, Optional, Required, Schema
+from voluptuous.error import DictInvalid, RequiredFieldInvalid, SequenceTypeInvalid, TypeInvalid, ValueInvalid
 
 from configpp.tree.exceptions import ConfigTreeBuilderException, ConfigTreeDumpException
 from configpp.tree.items import NodeBase
 from configpp.tree.settings import Settings
 
+_typing_modules = ('typing', 'types', 'typing_extensions')
+
+MISSING = object()
+
+COMPACT_CLASS_ATTRIBUTE = '_configpp_compact_class'
+
+def get_typing_origin(hint):
+    # typing_inspect is imported only if there is a generic hint
+    if type(hint).__module__ not in _typing_modules:
+        return None
+    import typing_inspect
+    return typing_inspect.get_origin(hint)
+
+def get_typing_args(hint) -> tuple:
+    import typing_inspect
+    return typing_inspect.get_args(hint)
+
+def collect_errors(errors: list, error: Invalid, key_path: list):
+    """Collect the errors of a dictionary value the same way as voluptuous does"""
+    for err in error.errors if isinstance(error, MultipleInvalid) else [error]:
+        if len(err.path) <= len(key_path):
+            err.error_type = 'dictionary value'
+        errors.append(err)
+
+def get_default_value(default):
+    # same as the voluptuous Optional: the callable default is a factory
+    return default() if callable(default) else default
+
 def camel_case_split(identifier):
     matches = finditer('.+?(?:(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|$)', identifier)
     return [m.group(0) for m in matches]
@@ -29,8 +57,16 @@ class ItemFactoryBase(ABC):
         pass
 
     @abstractmethod
-    def process_value(self, value, parent_instance = None):
-        pass
+    def load(self, path: list, value, parent_instance = None):
+        """Validate the value and construct the item in one traversal
+
+        The errors are the same as the voluptuous schema of the item would raise.
+
+        Args:
+            path: path of the value in the raw data, for the errors
+            value: the raw value
+            parent_instance: the node instance which will hold the item
+        """
 
     @abstractmethod
     def dump(self, value):
@@ -45,6 +81,7 @@ class LeafFactory(ItemFactoryBase):
     def __init__(self, validator = None, default = UNDEFINED):
         super().__init__(default)
         self._validator = validator
+        self._load_validator = None
 
     def create_schema(self):
         return self._validator
@@ -53,12 +90,62 @@ class LeafFactory(ItemFactoryBase):
         return value
 
     def process_value(self, value, parent_instance = None):
+        """Construct the item from the validated value"""
         return value
 
+    def load(self, path: list, value, parent_instance = None):
+        if self._load_validator is None:
+            schema = self.create_schema()
+            if isinstance(schema, type):
+                def validator(path, value):
+                    if not isinstance(value, schema):
+                        raise TypeInvalid('expected %s' % schema.__name__, path)
+                    return value
+                self._load_validator = validator
+            else:
+                self._load_validator = Schema(schema)._compiled
+        return self.process_value(self._load_validator(path, value), parent_instance)
+
     def __repr__(self):
         return "<LeafFactory default: {}, validator: {}".format(self._default, self._validator)
 
-LeafFactoryRegistry = Dict[type, LeafFactory]
+def find_leaf_factory(registry: Dict[type, LeafFactory], type_: type) -> LeafFactory:
+    """Give back the factory of the most specific registered type in the MRO of the type
+
+    The types which are not in the MRO (eg the virtual subclasses of an ABC) are checked by issubclass at last.
+    """
+    for base in inspect.getmro(type_):
+        factory = registry.get(base)
+        if factory is not None:
+            return factory
+
+    for ftype, factory in registry.items():
+        if issubclass(type_, ftype):
+            return factory
+
+    return LeafFactory
+
+class LeafFactoryRegistry(dict):
+    """The leaf factories by type, the resolved factories are cached until the registry is changed"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._resolved = {}  # type: Dict[type, LeafFactory]
+
+    def __setitem__(self, type_: type, factory: LeafFactory):
+        super().__setitem__(type_, factory)
+        self._resolved.clear()
+
+    def __delitem__(self, type_: type):
+        super().__delitem__(type_)
+        self._resolved.clear()
+
+    def resolve(self, type_: type) -> LeafFactory:
+        try:
+            return self._resolved[type_]
+        except KeyError:
+            factory = self._resolved[type_] = find_leaf_factory(self, type_)
+            return factory
 
 class NodeFactory(ItemFactoryBase):
     def __init__(self, settings: Settings, leaf_factory_registry: LeafFactoryRegistry, default = UNDEFINED):
@@ -67,17 +154,9 @@ class NodeFactory(ItemFactoryBase):
         self._leaf_factory_registry = leaf_factory_registry
 
     def get_leaf_factory(self, type_) -> LeafFactory:
-        # search for exact match
-        factory = self._leaf_factory_registry.get(type_)
-        if factory is not None:
-            return factory
-
-        # search by parent
-        for ftype, factory in self._leaf_factory_registry.items():
-            if issubclass(type_, ftype):
-                return factory
-
-        return LeafFactory
+        if isinstance(self._leaf_factory_registry, LeafFactoryRegistry):
+            return self._leaf_factory_registry.resolve(type_)
+        return find_leaf_factory(self._leaf_factory_registry, type_)
 
     def create_item(self, attr) -> ItemFactoryBase:
         if inspect.isfunction(attr):
@@ -101,6 +180,21 @@ class NodeFactory(ItemFactoryBase):
             else:
                 return self.get_leaf_factory(type(attr))(type(attr), attr)
 
+class DumpMethod():
+    """Class level dump method of the compact node instances, so the instances do not need an own partial
+
+    Args:
+        dump: the function to dump an instance
+    """
+
+    def __init__(self, dump):
+        self._dump = dump
+
+    def __get__(self, instance, owner = None):
+        if instance is None:
+            return self
+        return partial(self._dump, instance)
+
 class AttrNodeFactory(NodeFactory):
     def __init__(self, cls: type, settings: Settings, leaf_factory_registry: LeafFactoryRegistry, excluded_attributes: list = None,
                  default = UNDEFINED, external_item_registry: Dict[int, ItemFactoryBase] = None):
@@ -110,30 +204,70 @@ class AttrNodeFactory(NodeFactory):
         self._items = {}  # type: Dict[str, ItemFactoryBase]
         self._external_item_registry = external_item_registry or {}
         self._attribute_map = {}  # type: Dict[str, str]
+        self._keys = frozenset()
+        self._instance_class = cls
 
     @property
     def cls(self):
         return self._cls
 
+    @property
+    def instance_class(self) -> type:
+        """Class of the loaded instances: the node class or its generated compact subclass if the compact_nodes is set"""
+        return self._instance_class
+
+    @property
+    def compact(self) -> bool:
+        return self._instance_class is not self._cls
+
+    @property
+    def items(self) -> Dict[str, ItemFactoryBase]:
+        return self._items
+
+    @property
+    def attribute_map(self) -> Dict[str, str]:
+        return self._attribute_map
+
     def dump(self, instance):
         res = {}
         for name, item in self._items.items():
             res[self._attribute_map[name]] = item.dump(getattr(instance, name))
         return res
 
-    def process_value(self, value, parent_instance = None):
-        instance = self._cls()
+    def load(self, path: list, value, parent_instance = None):
+        if not isinstance(value, dict):
+            raise DictInvalid('expected a dictionary', path)
+
+        errors = []
+        instance = self._instance_class()
 
-        if self._settings.dump_method_name_in_node_classes:
+        if self._settings.dump_method_name_in_node_classes and not self.compact:
             setattr(instance, self._settings.dump_method_name_in_node_classes, partial(self.dump, instance))
 
         for name, item in self._items.items():
-            val = item.process_value(value[self._attribute_map[name]], instance)
-            setattr(instance, name, val)
+            key = self._attribute_map[name]
+            val = value.get(key, MISSING)
+            if val is MISSING:
+                if item.default == UNDEFINED:
+                    errors.append(RequiredFieldInvalid('required key not provided', path + [key]))
+                    continue
+                val = get_default_value(item.default)
+            try:
+                setattr(instance, name, item.load(path + [key], val, instance))
+            except Invalid as e:
+                collect_errors(errors, e, path + [key])
+
+        if not self._keys.issuperset(value):
+            for key in value:
+                if key not in self._keys:
+                    errors.append(Invalid('extra keys not allowed', path + [key]))
+
+        if errors:
+            raise MultipleInvalid(errors)
         return instance
 
     def _iter_member(self, name: str, attr, result: dict):
-        if name in self._excluded_attributes:
+        if name in self._excluded_attributes or name == COMPACT_CLASS_ATTRIBUTE:
             return
 
         if self._settings.member_iteration_filter_pattern.search(name):
@@ -141,7 +275,7 @@ class AttrNodeFactory(NodeFactory):
 
         attr_id = id(attr)
 
-        attr_typing_origin = typing_inspect.get_origin(attr)
+        attr_typing_origin = get_typing_origin(attr)
 
         if hasattr(attr, '_configpp_tree_item'):
             item = getattr(attr, '_configpp_tree_item')
@@ -149,9 +283,9 @@ class AttrNodeFactory(NodeFactory):
             item = self._external_item_registry[attr_id]
         elif attr_typing_origin:
             if attr_typing_origin in (list, List):
-                item = ListNodeFactory(typing_inspect.get_args(attr), self._settings, self._leaf_factory_registry)
+                item = ListNodeFactory(get_typing_args(attr), self._settings, self._leaf_factory_registry)
             elif attr_typing_origin in (dict, Dict):
-                item = DictNodeFactory(*typing_inspect.get_args(attr), self._settings, self._leaf_factory_registry)
+                item = DictNodeFactory(*get_typing_args(attr), self._settings, self._leaf_factory_registry)
             else:
                 # TODO print some log error?
                 return
@@ -188,6 +322,8 @@ class AttrNodeFactory(NodeFactory):
             self._iter_member(name, hint, schema_dict)
 
         schema = Schema(schema_dict)
+        self._keys = frozenset(self._attribute_map.values())
+        self._instance_class = self._create_compact_class() if self._settings.compact_nodes else self._cls
 
         for item in self._items.values():
             if item.default == UNDEFINED:
@@ -197,21 +333,72 @@ class AttrNodeFactory(NodeFactory):
 
         return schema
 
+    def _create_compact_class(self) -> type:
+        """Generate a subclass of the node class which holds the items in slots
+
+        The instances never create their __dict__ (unless an other attribute is set), so they are much smaller. The subclass is
+        stored in the node class too, so the instances can be pickled.
+        """
+        slotted = set()
+        for base in inspect.getmro(self._cls):
+            slots = base.__dict__.get('__slots__', ())
+            slotted.update([slots] if isinstance(slots, str) else slots)
+
+        dump_method_name = self._settings.dump_method_name_in_node_classes
+        namespace = {
+            '__slots__': tuple(name for name in self._items if name not in slotted and name != dump_method_name),
+            '__module__': self._cls.__module__,
+            '__qualname__': '{}.{}'.format(self._cls.__qualname__, COMPACT_CLASS_ATTRIBUTE),
+        }
+        if dump_method_name:
+            namespace[dump_method_name] = DumpMethod(self.dump)
+
+        compact_class = type(self._cls)(self._cls.__name__, (self._cls, ), namespace)
+        setattr(self._cls, COMPACT_CLASS_ATTRIBUTE, compact_class)
+        return compact_class
+
 class DictNodeFactory(NodeFactory):
     def __init__(self, key_type: type, value_type: type, settings: Settings, leaf_factory_registry: LeafFactoryRegistry, default = UNDEFINED):
         super().__init__(settings, leaf_factory_registry, default = default)
         self._key_type = key_type
         self._value_type = value_type
         self._item = None # type: ItemFactoryBase
+        self._key_validator = None
+
+    @property
+    def key_type(self):
+        return self._key_type
+
+    @property
+    def item(self) -> ItemFactoryBase:
+        return self._item
 
     def create_schema(self):
         self._item = self.create_item(self._value_type)
         return Schema({self._key_type: self._item.create_schema()})
 
-    def process_value(self, value: dict, parent_instance = None):
+    def load(self, path: list, value, parent_instance = None):
+        if not isinstance(value, dict):
+            raise DictInvalid('expected a dictionary', path)
+
+        if self._key_validator is None:
+            self._key_validator = Schema(self._key_type)._compiled
+
+        errors = []
         res = {}
         for key, val in value.items():
-            res[key] = self._item.process_value(val)
+            try:
+                new_key = self._key_validator(path + [key], key)
+            except Invalid as e:
+                errors.append(e)
+                continue
+            try:
+                res[new_key] = self._item.load(path + [key], val)
+            except Invalid as e:
+                collect_errors(errors, e, path + [key])
+
+        if errors:
+            raise MultipleInvalid(errors)
         return res
 
     def dump(self, instance: dict):
@@ -221,11 +408,37 @@ class DictNodeFactory(NodeFactory):
         return res
 
 class ListNodeFactory(NodeFactory):
-    def __init__(self, value_types: list, settings: Settings, leaf_factory_registry: LeafFactoryRegistry, default = UNDEFINED):
+    """List of values of one or more types
+
+    With more types every value is routed to its item by an index built with the schema, so the items are not tried one by
+    one. With discriminator every type must be a node with a leaf of that name with default (the tag), and the value of this key
+    selects the type. Without discriminator the node types are routed by a required key which the other types do not have,
+    and the leaf types by the exact type of the value. The values which cannot be routed are tried with every item.
+
+    Args:
+        value_types: the types of the values
+        discriminator: data key of the tag in the node types
+    """
+
+    def __init__(self, value_types: list, settings: Settings, leaf_factory_registry: LeafFactoryRegistry, default = UNDEFINED,
+                 discriminator: str = None):
         super().__init__(settings, leaf_factory_registry, default = default)
         self._value_types = value_types
+        self._discriminator = discriminator
         self._schemas = []
+        self._validators = []
         self._items = []
+        self._tag_index = {}  # type: Dict[object, int]
+        self._type_index = {}  # type: Dict[type, int]
+        self._key_index = []  # type: List[tuple]
+
+    @property
+    def items(self) -> List[ItemFactoryBase]:
+        return self._items
+
+    @property
+    def discriminator(self) -> str:
+        return self._discriminator
 
     def create_schema(self):
         for type_ in self._value_types:
@@ -236,23 +449,130 @@ class ListNodeFactory(NodeFactory):
 
         self._items = [self.create_item(type_) for type_ in self._value_types]
         self._schemas = [item.create_schema() for item in self._items]
+        self._build_index()
+        if self._discriminator is not None or self._type_index or self._key_index:
+            self._validators = [Schema(schema)._compiled for schema in self._schemas]
+            return Schema(self._validate)
         return self._schemas
 
-    def process_value(self, value: list, parent_instance = None):
+    def _get_tag(self, item: ItemFactoryBase):
+        if isinstance(item, AttrNodeFactory):
+            for name, key in item.attribute_map.items():
+                if key == self._discriminator and item.items[name].default != UNDEFINED:
+                    return item.items[name].default
+        raise ConfigTreeBuilderException("The type {!r} has no '{}' leaf with default for the discriminator"
+                                         .format(item, self._discriminator))
+
+    def _build_index(self):
+        self._tag_index = {}
+        self._type_index = {}
+        self._key_index = []
+
+        if self._discriminator is not None:
+            for idx, item in enumerate(self._items):
+                tag = self._get_tag(item)
+                if tag in self._tag_index:
+                    raise ConfigTreeBuilderException("Duplicated tag {!r} for the discriminator '{}'".format(tag, self._discriminator))
+                self._tag_index[tag] = idx
+            return
+
+        if len(self._items) < 2:
+            return
+
+        key_sets = {}
+        for idx, item in enumerate(self._items):
+            if isinstance(item, AttrNodeFactory):
+                required = [key for name, key in item.attribute_map.items() if item.items[name].default == UNDEFINED]
+                key_sets[idx] = (required, set(item.attribute_map.values()))
+            elif isinstance(self._schemas[idx], type):
+                self._type_index.setdefault(self._schemas[idx], idx)
+            else:
+                # a custom validator may accept anything
+                self._type_index = {}
+                return
+
+        if dict in self._type_index and key_sets:
+            # a dict value may belong to the dict leaf or to any node
+            del self._type_index[dict]
+            return
+
+        for idx, (required, _) in key_sets.items():
+            for key in required:
+                if not any(key in keys for other, (_, keys) in key_sets.items() if other != idx):
+                    self._key_index.append((key, idx))
+                    break
+
+    def route(self, value) -> int:
+        """Give back the index of the only item which can accept the value, None if it cannot be decided without trying"""
+        if self._discriminator is not None:
+            if not isinstance(value, dict):
+                return None
+            try:
+                return self._tag_index.get(value.get(self._discriminator))
+            except TypeError:
+                # unhashable tag
+                return None
+
+        idx = self._type_index.get(type(value))
+        if idx is not None:
+            return idx
+
+        if isinstance(value, dict):
+            for key, idx in self._key_index:
+                if key in value:
+                    return idx
+
+        return None
+
+    def tag_error(self, path: list, value) -> Invalid:
+        if not isinstance(value, dict):
+            return DictInvalid('expected a dictionary', path)
+        if self._discriminator not in value:
+            return RequiredFieldInvalid('required key not provided', path + [self._discriminator])
+        return ValueInvalid('not a valid value', path + [self._discriminator])
+
+    def _validate(self, value: list):
+        # the list validation of the schema, with the same routing as the load
+        return self._load_values([], value, lambda idx, path, val: self._validators[idx](path, val))
+
+    def _load_values(self, path: list, value, load_item) -> list:
+        """Route the values to their item and load them with the load_item(item index, path, value) function, the values which
+        cannot be routed are tried with every item. The errors are the same as the voluptuous list validation would raise."""
+        if not isinstance(value, list):
+            raise SequenceTypeInvalid('expected a list', path)
+
+        errors = []
         res = []
-        for val in value:
-            # searching the matching schema and ItemFactory
-            for idx, schema in enumerate(self._schemas):
+        for idx, val in enumerate(value):
+            route = self.route(val) if len(self._items) > 1 else 0
+            if route is None and self._discriminator is not None:
+                errors.append(self.tag_error(path + [idx], val))
+                continue
+            invalid = None
+            for item_idx in range(len(self._items)) if route is None else [route]:
                 try:
-                    schema(val)
-                    res.append(self._items[idx].process_value(val))
+                    res.append(load_item(item_idx, path + [idx], val))
                     break
-                except MultipleInvalid:
-                    continue
+                except Invalid as e:
+                    if len(e.path) > len(path) + 1:
+                        raise
+                    invalid = e
             else:
-                raise ConfigTreeBuilderException("Matching schema not found for value: '{}'".format(val))
+                errors.append(invalid)
+
+        if errors:
+            raise MultipleInvalid(errors)
         return res
 
+    def load(self, path: list, value, parent_instance = None):
+        if not self._items:
+            if not isinstance(value, list):
+                raise SequenceTypeInvalid('expected a list', path)
+            if value:
+                raise MultipleInvalid([ValueInvalid('not a valid value', path if path else value)])
+            return []
+        return self._load_values(path, value, lambda idx, path, val: self._items[idx].load(path, val))
+
     def dump(self, instance: []):
         if len(self._items) > 1:
             raise ConfigTreeDumpException("cannot dump a list with multiple types yet")
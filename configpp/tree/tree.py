@@ -1,6 +1,11 @@
 import logging
+import os
+from collections import namedtuple
+from functools import partial
+from itertools import count, islice
+from typing import Iterable, Iterator
 
-from voluptuous import UNDEFINED, Schema
+from voluptuous import UNDEFINED, Invalid, Marker, MultipleInvalid, Schema
 
 from configpp.tree.custom_item_factories import DateTimeLeafFactory, Enum, EnumLeafFactory, LeafBaseFactory, datetime
 from configpp.tree.exceptions import ConfigTreeBuilderException
@@ -10,39 +15,173 @@ from configpp.tree.settings import Settings
 
 logger = logging.getLogger(__name__)
 
+SchemaCacheInfo = namedtuple('SchemaCacheInfo', ['hits', 'misses'])
+
+LoadResult = namedtuple('LoadResult', ['index', 'value', 'error'])
+LoadResult.__doc__ = """Result of an item of Tree.load_many
+
+Args:
+    index: position of the raw data in the source iterable
+    value: the loaded root instance, None if the item is invalid
+    error: MultipleInvalid if the item is invalid, None otherwise
+"""
+
+# the trees of the running process pools, the forked workers inherit them so the tree does not need to be pickled
+_pool_trees = {}
+_pool_tree_ids = count()
+
+def _load_chunk(tree: 'Tree', chunk: list) -> list:
+    results = []
+    for index, raw_data in chunk:
+        try:
+            results.append(LoadResult(index, tree.load(raw_data), None))
+        except MultipleInvalid as e:
+            results.append(LoadResult(index, None, e))
+        except Invalid as e:
+            results.append(LoadResult(index, None, MultipleInvalid([e])))
+    return results
+
+def _picklable_error(error: MultipleInvalid) -> MultipleInvalid:
+    """The markers (eg Required) in the paths hold the compiled validators, which cannot be pickled, so replace them with their keys"""
+    errors = []
+    for err in error.errors:
+        path = [key.schema if isinstance(key, Marker) else key for key in err.path]
+        errors.append(type(err)(err.msg, path, err.error_message, err.error_type))
+    return MultipleInvalid(errors)
+
+def _load_chunk_in_worker(tree_id: int, chunk: list) -> list:
+    return [result if result.error is None else result._replace(error = _picklable_error(result.error))
+            for result in _load_chunk(_pool_trees[tree_id], chunk)]
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    source = enumerate(items)
+    while True:
+        chunk = list(islice(source, size))
+        if not chunk:
+            return
+        yield chunk
+
 class Tree():
 
     def __init__(self, settings: Settings = None):
         self._settings = settings or Settings()
         self._root = None  # type: NodeFactory
         self._extra_items = {}
-        self._leaf_factory_registry = {
+        self._leaf_factory_registry = LeafFactoryRegistry({
             datetime: DateTimeLeafFactory,
             Enum: EnumLeafFactory,
             LeafBase: LeafBaseFactory,
-        }  # type: LeafFactoryRegistry
+        })
+        self._schema = None  # type: Schema
+        self._compiled = None  # type: configpp.tree.compiler.CompiledItem
+        self._schema_cache_hits = 0
+        self._schema_cache_misses = 0
 
     def set_root(self, value: NodeFactory):
         self._root = value
+        self.invalidate_schema()
 
     def register_leaf_factory(self, type_: type, factory: LeafFactory):
+        # the most specific registered type in the MRO of a leaf type wins, the registry drops its resolved cache
         self._leaf_factory_registry[type_] = factory
+        self.invalidate_schema()
+
+    def invalidate_schema(self):
+        """Drop the cached schema, the next build_schema call will walk the node classes again"""
+        self._schema = None
+        self._compiled = None
+
+    def schema_cache_info(self) -> SchemaCacheInfo:
+        return SchemaCacheInfo(self._schema_cache_hits, self._schema_cache_misses)
 
     def build_schema(self) -> Schema:
+        if self._schema is not None:
+            self._schema_cache_hits += 1
+            return self._schema
         if self._root is None:
             raise ConfigTreeBuilderException("There is no root!")
+        self._schema_cache_misses += 1
         # TODO: resolve this problem somehow else (AttrNodeFactory gives back Schema but the DictNodeFactory and the ListNodeFactory dont)
         schema = self._root.create_schema()
         if not callable(schema):
             schema = Schema(schema)
+        logger.debug("Schema has been built for root: %s", self._root)
+        self._schema = schema
+        if self._settings.compile_nodes:
+            from configpp.tree.compiler import NodeCompiler
+            self._compiled = NodeCompiler(self._settings).compile(self._root)
         return schema
 
     def load(self, raw_data: dict):
-        schema = self.build_schema()
-        data = schema(raw_data)
-        return self._root.process_value(data)
+        self.build_schema()
+        if self._compiled is not None:
+            return self._compiled.load(raw_data)
+        # the factories validate and construct in one traversal, the schema is not used (but it collects the items)
+        try:
+            return self._root.load([], raw_data)
+        except MultipleInvalid:
+            raise
+        except Invalid as e:
+            raise MultipleInvalid([e])
+
+    def load_many(self, items: Iterable[dict], workers: int = None, chunksize: int = 64,
+                  use_processes: bool = True) -> Iterator[LoadResult]:
+        """Load lot of raw data with the same root, in parallel
+
+        The schema is built only once. The results are streamed back in the order of the items, an invalid item does not
+        stop the others, its error is in the LoadResult.
+
+        The process pool needs the fork start method (the workers inherit the tree) and picklable root instances (the node
+        classes must be importable), otherwise use threads. The per instance dump methods of the dump_method_name_in_node_classes
+        setting cannot be pickled, so with that setting the items are loaded in threads unless the compact_nodes setting puts the
+        dump methods into the node classes.
+
+        Args:
+            items: the raw data
+            workers: number of the workers, default is the number of the cpus, 1 loads in the current thread
+            chunksize: number of the items sent to a worker at once
+            use_processes: use process pool instead of thread pool
+        """
+        import multiprocessing
+        from multiprocessing.pool import ThreadPool
+
+        self.build_schema()
+        workers = workers or os.cpu_count() or 1
+        chunks = _chunks(items, chunksize)
+
+        if workers == 1:
+            for chunk in chunks:
+                yield from _load_chunk(self, chunk)
+            return
+
+        if use_processes and 'fork' not in multiprocessing.get_all_start_methods():
+            logger.warning("The fork start method is not available, load with threads")
+            use_processes = False
+
+        if use_processes and self._settings.dump_method_name_in_node_classes and not self._settings.compact_nodes:
+            logger.warning("The per instance dump methods cannot be sent back from the worker processes, load with threads")
+            use_processes = False
+
+        if not use_processes:
+            with ThreadPool(workers) as pool:
+                for results in pool.imap(partial(_load_chunk, self), chunks):
+                    yield from results
+            return
+
+        tree_id = next(_pool_tree_ids)
+        _pool_trees[tree_id] = self
+        try:
+            # the workers are forked at the creation of the pool, so the tree must be registered before
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                for results in pool.imap(partial(_load_chunk_in_worker, tree_id), chunks):
+                    yield from results
+        finally:
+            del _pool_trees[tree_id]
 
     def dump(self, data) -> dict:
+        if self._settings.compile_nodes:
+            self.build_schema()
+            return self._compiled.dump(data)
         return self._root.dump(data)
 
     def root(self, excluded_attributes: list = None):
@@ -51,6 +190,7 @@ class Tree():
         def decor(cls):
             self._root = AttrNodeFactory(cls, self._settings, self._leaf_factory_registry, excluded_attributes,
                                          external_item_registry = self._extra_items)
+            self.invalidate_schema()
             return cls
         return decor
 
@@ -59,14 +199,16 @@ class Tree():
             logger.warning("Root node has been set already to: %s", self._root)
         def decor(cls):
             self._root = DictNodeFactory(key_type, value_type, self._settings, self._leaf_factory_registry, default)
+            self.invalidate_schema()
             return cls
         return decor
 
-    def list_root(self, value_types, default = UNDEFINED):
+    def list_root(self, value_types, default = UNDEFINED, discriminator: str = None):
         if self._root is not None:
             logger.warning("Root node has been set already to: %s", self._root)
         def decor(cls):
-            self._root = ListNodeFactory(value_types, self._settings, self._leaf_factory_registry, default)
+            self._root = ListNodeFactory(value_types, self._settings, self._leaf_factory_registry, default, discriminator)
+            self.invalidate_schema()
             return cls
         return decor
 
@@ -75,15 +217,16 @@ class Tree():
             node = AttrNodeFactory(cls, self._settings, self._leaf_factory_registry, excluded_attributes, default,
                                    external_item_registry = self._extra_items)
             cls._configpp_tree_item = node
+            self.invalidate_schema()
             return cls
         return wrapper
 
     def dict_node(self, key_type, value_type, default = UNDEFINED):
         return DictNodeFactory(key_type, value_type, self._settings, self._leaf_factory_registry, default)
 
-    def list_node(self, value_types: list, default = UNDEFINED):
-        """TODO"""
-        return ListNodeFactory(value_types, self._settings, self._leaf_factory_registry, default)
+    def list_node(self, value_types: list, default = UNDEFINED, discriminator: str = None):
+        """List of values of the given types, see ListNodeFactory for the discriminator"""
+        return ListNodeFactory(value_types, self._settings, self._leaf_factory_registry, default, discriminator)
 
     def leaf(self, validator = None, default = UNDEFINED):
         return LeafFactory(validator, default)
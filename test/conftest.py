@@ -0,0 +1,46 @@
+import os
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from pytest import fixture
+from voidpp_tools.mocks.file_system import FileSystem
+from voidpp_tools.mocks.file_system.handlers import MockStringIO
+
+class MockDirEntry():
+
+    def __init__(self, folder: str, name: str):
+        self.name = name
+        self.path = os.path.join(folder, name)
+
+    def is_file(self):
+        return os.path.isfile(self.path)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+def mock_scandir(path = '.'):
+    # built on the mocked listdir and isfile
+    return iter([MockDirEntry(path, name) for name in os.listdir(path)])
+
+# the mocked files have no real fd, their fileno gives this one
+MOCK_FD = -1
+
+def mock_fstat_factory(fstat):
+    def mock_fstat(fd):
+        # built on the mocked stat
+        return os.stat('/') if fd == MOCK_FD else fstat(fd)
+    return mock_fstat
+
+@fixture(autouse = True)
+def mockfs_scandir(monkeypatch):
+    """The mockfs does not patch the os.scandir and the os.fstat, extend it for the locations which list the folders with scandir
+    and take the stat of the opened files"""
+    original_mock = FileSystem.mock
+
+    @contextmanager
+    def mock(self):
+        with original_mock(self), patch('os.scandir', mock_scandir), patch('os.fstat', mock_fstat_factory(os.fstat)), \
+                patch.object(MockStringIO, 'fileno', lambda self: MOCK_FD, create = True):
+            yield
+
+    monkeypatch.setattr(FileSystem, 'mock', mock)
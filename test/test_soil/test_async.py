@@ -0,0 +1,105 @@
+import asyncio
+from voidpp_tools.mocks.file_system import mockfs
+from configpp.soil import Config, Group, GroupMember, Location, Transport
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+_data_filename = 'test1.json'
+
+@mockfs({'etc': {_data_filename: '{"a": 42}'}, 'home': {'douglas': {}}})
+def test_aload_simple():
+
+    cfg = Config(_data_filename)
+
+    assert run(cfg.aload()) is True
+    assert cfg.data == {'a': 42}
+    assert cfg.path == '/etc/' + _data_filename
+
+def test_aload_simple_not_found():
+
+    cfg = Config(_data_filename, transport = Transport([Location('/teve/muha')]))
+
+    assert run(cfg.aload()) is False
+
+@mockfs({'etc': {'test1': {'core.json': '{"a": 42}', 'logger.json': '{"b": 42}'}}})
+def test_aload_group():
+
+    core = GroupMember('core.json')
+    logger = GroupMember('logger.json')
+    db = GroupMember('db.json', mandatory = False)
+
+    grp = Group('test1', [core, logger, db])
+
+    assert run(grp.aload())
+    assert core.data == {'a': 42}
+    assert logger.data == {'b': 42}
+    assert db.is_loaded is False
+
+@mockfs({'etc': {'test1': {'logger.json': '{"b": 42}'}}})
+def test_cant_aload_group_missing_one():
+
+    grp = Group('test1', [GroupMember('core.json'), GroupMember('logger.json')])
+
+    assert run(grp.aload()) is False
+
+@mockfs({'etc': {'test1': {'core.json': '{"a": 42}', 'logger.json': '{"b": 42}'}}})
+def test_adump_group():
+
+    core = GroupMember('core.json')
+    logger = GroupMember('logger.json')
+
+    grp = Group('test1', [core, logger])
+
+    assert run(grp.aload())
+
+    core.data['a'] = 43
+    logger.data['b'] = 43
+
+    run(grp.adump())
+
+    with open('/etc/test1/core.json') as f:
+        assert f.read() == '{"a": 43}'
+
+    with open('/etc/test1/logger.json') as f:
+        assert f.read() == '{"b": 43}'
+
+@mockfs({'etc': {}})
+def test_adump_simple():
+
+    cfg = Config(_data_filename)
+    cfg.data = {'a': 42}
+
+    assert run(cfg.adump(Location('/etc')))
+
+    with open('/etc/' + _data_filename) as f:
+        assert f.read() == '{"a": 42}'
+
+class ConcurrencyLocation(Location):
+    """Counts the reads running at the same time"""
+
+    def __init__(self, base_path: str):
+        super().__init__(base_path)
+        self.running = 0
+        self.max_running = 0
+
+    async def aread_with_key(self, path: str):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return self.read_with_key(path)
+
+@mockfs({'etc': {'test1': {'core.json': '{"a": 42}', 'logger.json': '{"b": 42}', 'db.json': '{"c": 42}'}}})
+def test_aload_group_reads_members_concurrently():
+
+    location = ConcurrencyLocation('/etc')
+    grp = Group('test1', [GroupMember('core.json'), GroupMember('logger.json'), GroupMember('db.json')], Transport([location]))
+
+    assert run(grp.aload())
+    assert grp.members['db.json'].data == {'c': 42}
+    assert location.max_running == 3
@@ -0,0 +1,132 @@
+from configpp.soil import Config, Group, GroupMember, Location, ReadCache, Transport, YamlTransform
+
+def test_cached_load_not_changed(tmpdir):
+
+    tmpdir.join('app.json').write('{"a": 42}')
+
+    cache = ReadCache()
+    cfg = Config('app.json', transport = Transport([Location(str(tmpdir))], cache = cache))
+
+    assert cfg.load()
+    cfg.data['a'] = 84
+    assert cfg.load()
+
+    assert cfg.data == {'a': 42}
+    assert cache.cache_info().hits == 1
+    assert cache.cache_info().misses == 1
+
+def test_cached_load_changed(tmpdir):
+
+    path = tmpdir.join('app.json')
+    path.write('{"a": 42}')
+
+    cache = ReadCache()
+    cfg = Config('app.json', transport = Transport([Location(str(tmpdir))], cache = cache))
+
+    assert cfg.load()
+
+    path.write('{"a": 4200}')
+
+    assert cfg.load()
+    assert cfg.data == {'a': 4200}
+    assert cache.cache_info().misses == 2
+
+def test_cache_invalidated_by_dump(tmpdir):
+
+    tmpdir.join('app.json').write('{"a": 42}')
+
+    cache = ReadCache()
+    cfg = Config('app.json', transport = Transport([Location(str(tmpdir))], cache = cache))
+
+    assert cfg.load()
+    cfg.data = {'a': 21}
+    cfg.dump()
+
+    assert cache.cache_info().entries == 0
+    assert cfg.load()
+    assert cfg.data == {'a': 21}
+
+def test_cache_lru_eviction(tmpdir):
+
+    for idx in range(3):
+        tmpdir.join('cfg{}.json'.format(idx)).write('{"a": 4200}')
+
+    cache = ReadCache(max_size = 22)
+    location = Location(str(tmpdir), cache)
+
+    for idx in range(3):
+        location.read('cfg{}.json'.format(idx))
+
+    info = cache.cache_info()
+
+    assert info.entries == 2
+    assert info.size == 22
+
+    location.read('cfg2.json')
+    location.read('cfg0.json')
+
+    assert cache.cache_info().hits == 1
+
+def test_cache_too_big_file(tmpdir):
+
+    tmpdir.join('app.json').write('{"a": 4200}')
+
+    cache = ReadCache(max_size = 5)
+
+    assert Location(str(tmpdir), cache).read('app.json') == '{"a": 4200}'
+    assert cache.cache_info().entries == 0
+
+def test_cache_data_per_transform(tmpdir):
+
+    tmpdir.join('app.json').write('{"a": 42}')
+
+    cache = ReadCache()
+    location = Location(str(tmpdir), cache)
+    target = location.target_path('app.json')
+
+    assert cache.load(target, Config('app.json').transform) == {'a': 42}
+    assert cache.load(target, YamlTransform()) == {'a': 42}
+    assert cache.cache_info() == (1, 1, 9, 1)
+
+def test_cached_group_load(tmpdir):
+
+    tmpdir.mkdir('app')
+    tmpdir.join('app', 'core.json').write('{"a": 42}')
+
+    cache = ReadCache()
+    core = GroupMember('core.json')
+    grp = Group('app', [core], Transport([Location(str(tmpdir))], cache = cache))
+
+    assert grp.load()
+    assert grp.load()
+
+    assert core.data == {'a': 42}
+    assert cache.cache_info().hits == 1
+
+def test_cache_shared_data(tmpdir):
+
+    tmpdir.join('app.json').write('{"a": 42}')
+
+    cache = ReadCache(share_data = True)
+    location = Location(str(tmpdir), cache)
+    target = location.target_path('app.json')
+    transform = Config('app.json').transform
+
+    data = cache.load(target, transform)
+
+    assert cache.load(target, transform) is data
+
+def test_cache_data_belongs_to_the_caller(tmpdir):
+
+    tmpdir.join('app.json').write('{"a": 42}')
+
+    cache = ReadCache()
+    location = Location(str(tmpdir), cache)
+    target = location.target_path('app.json')
+    transform = Config('app.json').transform
+
+    data = cache.load(target, transform)
+    data['a'] = 84
+
+    assert cache.load(target, transform) == {'a': 42}
+    assert cache.cache_info().hits == 1
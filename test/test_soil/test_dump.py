@@ -1,6 +1,8 @@
 
 import os
-from configpp.soil import Config, Group, GroupMember, Location
+from pytest import raises
+from unittest.mock import patch
+from configpp.soil import Config, Durability, Group, GroupException, GroupMember, Location, Transport
 from voidpp_tools.mocks.file_system import FileSystem, mockfs
 
 
@@ -113,3 +115,162 @@ def test_loaded_group_config_partial_direct_dump():
         content = f.read()
 
     assert content == '{"a": 84}'
+
+def write_files(folder, files: dict):
+    for name, content in files.items():
+        with open(str(folder.join(name)), 'w') as f:
+            f.write(content)
+
+def read_file(path):
+    with open(str(path)) as f:
+        return f.read()
+
+def test_atomic_write(tmpdir):
+
+    write_files(tmpdir, {_data_filename: '{"a": 42}'})
+    os.chmod(str(tmpdir.join(_data_filename)), 0o640)
+
+    cfg = Config(_data_filename, transport = Transport([Location(str(tmpdir))], durability = Durability(fsync_dir = True)))
+
+    assert cfg.load()
+    cfg.data['a'] = 43
+
+    with patch('os.fsync', wraps = os.fsync) as fsync:
+        assert cfg.dump()
+
+    assert fsync.call_count == 2
+    assert read_file(tmpdir.join(_data_filename)) == '{"a": 43}'
+    assert os.stat(str(tmpdir.join(_data_filename))).st_mode & 0o777 == 0o640
+    assert os.listdir(str(tmpdir)) == [_data_filename]
+
+def test_in_place_write_fsync(tmpdir):
+
+    location = Location(str(tmpdir), durability = Durability(atomic = False))
+
+    with patch('os.fsync', wraps = os.fsync) as fsync:
+        assert location.write(_data_filename, '{"a": 43}')
+
+    assert fsync.call_count == 1
+    assert read_file(tmpdir.join(_data_filename)) == '{"a": 43}'
+    assert os.listdir(str(tmpdir)) == [_data_filename]
+
+def test_atomic_write_failed_serialize_keeps_original(tmpdir):
+
+    write_files(tmpdir, {_data_filename: '{"a": 42}'})
+
+    location = Location(str(tmpdir), durability = Durability())
+
+    class BrokenData():
+        pass
+
+    cfg = Config(_data_filename)
+    cfg.data = {'a': BrokenData()}
+
+    with raises(TypeError):
+        cfg.dump(location)
+
+    with patch('os.replace', side_effect = OSError('disk full')):
+        with raises(OSError):
+            location.write(_data_filename, '{"a": 43}')
+
+    assert read_file(tmpdir.join(_data_filename)) == '{"a": 42}'
+
+def test_dump_streams_into_the_file(tmpdir):
+
+    cfg = Config('app.yaml')
+    cfg.data = {'a': 42, 'b': [1, 2]}
+
+    with patch.object(cfg.transform, 'serialize', side_effect = AssertionError('not streamed')), \
+            patch.object(cfg.transform, 'serialize_to', wraps = cfg.transform.serialize_to) as serialize_to:
+        assert cfg.dump(Location(str(tmpdir)))
+        assert cfg.dump(Location(str(tmpdir), durability = Durability(fsync = False)))
+
+    assert serialize_to.call_count == 2
+    assert read_file(tmpdir.join('app.yaml')) == 'a: 42\nb:\n- 1\n- 2\n'
+    assert os.listdir(str(tmpdir)) == ['app.yaml']
+
+def test_in_place_dump_failed_serialize_keeps_original(tmpdir):
+
+    write_files(tmpdir, {_data_filename: '{"a": 1}'})
+
+    cfg = Config(_data_filename, transport = Transport([Location(str(tmpdir))]))
+
+    assert cfg.load()
+    cfg.data['b'] = {1, 2}
+
+    with raises(TypeError):
+        cfg.dump()
+
+    assert read_file(tmpdir.join(_data_filename)) == '{"a": 1}'
+
+def create_group(tmpdir, transactional = True):
+    core = GroupMember('core.json')
+    logger = GroupMember('logger.json')
+    return Group('test1', [core, logger], Transport([Location(str(tmpdir))]), transactional = transactional, retry_delay = 0)
+
+def test_transactional_group_dump(tmpdir):
+
+    write_files(tmpdir.mkdir('test1'), {'core.json': '{"a": 42}', 'logger.json': '{"b": 42}'})
+
+    grp = create_group(tmpdir)
+
+    assert grp.load()
+    assert grp.generation == 0
+
+    grp.members['core.json'].data['a'] = 43
+    grp.members['logger.json'].data['b'] = 43
+
+    with patch.object(Location, 'stage', autospec = True, side_effect = Location.stage) as stage:
+        assert grp.dump()
+
+    assert [call[0][1] for call in stage.call_args_list] == ['test1/core.json', 'test1/logger.json', 'test1/.generation', 'test1/.generation']
+    assert grp.generation == 2
+    assert read_file(tmpdir.join('test1', '.generation')) == '2'
+
+    grp2 = create_group(tmpdir)
+
+    assert grp2.load()
+    assert grp2.generation == 2
+    assert grp2.members['core.json'].data == {'a': 43}
+    assert grp2.members['logger.json'].data == {'b': 43}
+    assert sorted(os.listdir(str(tmpdir.join('test1')))) == ['.generation', 'core.json', 'logger.json']
+
+def test_transactional_group_failed_staging(tmpdir):
+
+    write_files(tmpdir.mkdir('test1'), {'core.json': '{"a": 42}', 'logger.json': '{"b": 42}'})
+
+    grp = create_group(tmpdir)
+
+    assert grp.load()
+
+    grp.members['core.json'].data['a'] = 43
+    grp.members['logger.json'].data = {'b': object()}
+
+    with raises(TypeError):
+        grp.dump()
+
+    assert read_file(tmpdir.join('test1', 'core.json')) == '{"a": 42}'
+    assert sorted(os.listdir(str(tmpdir.join('test1')))) == ['core.json', 'logger.json']
+
+def test_transactional_group_load_in_progress(tmpdir):
+
+    write_files(tmpdir.mkdir('test1'), {'core.json': '{"a": 42}', 'logger.json': '{"b": 42}', '.generation': '3'})
+
+    grp = create_group(tmpdir)
+    grp._max_retries = 3
+
+    with raises(GroupException):
+        grp.load()
+
+def test_transactional_group_load_retries_after_switch_over(tmpdir):
+
+    write_files(tmpdir.mkdir('test1'), {'core.json': '{"a": 42}', 'logger.json': '{"b": 42}', '.generation': '2'})
+
+    grp = create_group(tmpdir)
+
+    generations = iter([2, 4, 4, 4])
+
+    with patch.object(Group, 'read_generation', side_effect = lambda location = None: next(generations)):
+        assert grp.load()
+
+    assert grp.generation == 4
@@ -0,0 +1,92 @@
+
+from configpp.soil import Config, Durability, Location, Transport, observe, add_observer, remove_observer
+from configpp.soil import instrument
+from voidpp_tools.mocks.file_system import mockfs
+
+
+_data_filename = 'test1.json'
+_content = '{"a": 42}'
+
+class Recorder():
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def stages(self):
+        return [event.stage for event in self.events]
+
+@mockfs({'etc': {_data_filename: _content}})
+def test_load_emits_the_stages():
+    cfg = Config(_data_filename)
+
+    with observe(Recorder()) as recorder:
+        assert cfg.load() is True
+
+    stages = recorder.stages()
+    assert stages[0] == 'init_for'
+    assert 'check' in stages
+    assert stages[-2:] == ['read', 'deserialize']
+
+    read, deserialize = recorder.events[-2:]
+    assert read.name == _data_filename
+    assert read.size == len(_content)
+    assert deserialize.name == _data_filename
+    assert deserialize.size == len(_content)
+    assert all(event.duration >= 0 for event in recorder.events)
+
+def test_dump_emits_serialize_and_write(tmpdir):
+    cfg = Config(_data_filename, transport = Transport([Location(str(tmpdir))]))
+    cfg.data = {'a': 42}
+
+    with observe(Recorder()) as recorder:
+        assert cfg.dump(Location(str(tmpdir)))
+
+    assert recorder.stages() == ['serialize', 'write']
+    assert recorder.events[0].size == recorder.events[1].size == len(tmpdir.join(_data_filename).read())
+
+def test_atomic_dump_emits_one_write(tmpdir):
+    location = Location(str(tmpdir), durability = Durability(fsync = False))
+    cfg = Config(_data_filename)
+    cfg.data = {'a': 42}
+
+    with observe(Recorder()) as recorder:
+        assert cfg.dump(location)
+
+    assert recorder.stages() == ['serialize', 'write']
+
+def test_buffer_load_emits_the_size(tmpdir):
+    tmpdir.join(_data_filename).write(_content)
+    cfg = Config(_data_filename, transport = Transport([Location(str(tmpdir), mmap_threshold = 1)]))
+
+    with observe(Recorder()) as recorder:
+        assert cfg.load() is True
+
+    assert recorder.stages()[-2:] == ['read', 'deserialize']
+    assert recorder.events[-1].size == len(_content)
+
+@mockfs({'etc': {_data_filename: _content}})
+def test_no_observer_no_timing():
+    assert instrument.start() is None
+
+    recorder = Recorder()
+    add_observer(recorder)
+    remove_observer(recorder)
+
+    assert Config(_data_filename).load() is True
+    assert recorder.events == []
+    assert instrument.start() is None
+
+@mockfs({'etc': {_data_filename: _content}})
+def test_failing_observer_does_not_break_the_load():
+
+    def observer(event):
+        raise RuntimeError(event.stage)
+
+    with observe(observer):
+        cfg = Config(_data_filename)
+        assert cfg.load() is True
+
+    assert cfg.data == {'a': 42}
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+import pytest
+
+def imported_modules(code: str) -> set:
+    out = subprocess.check_output([sys.executable, '-c', code + '\nimport sys\nprint(" ".join(sys.modules))'])
+    return set(out.decode().split())
+
+def test_import_soil_does_not_import_ruamel():
+
+    modules = imported_modules('import configpp.soil')
+
+    assert 'ruamel.yaml' not in modules
+    assert 'yaml' not in modules
+
+def test_json_config_does_not_import_yaml_and_asyncio():
+
+    modules = imported_modules('from configpp.soil import Config\nConfig("app.json")')
+
+    assert 'ruamel.yaml' not in modules
+    assert 'yaml' not in modules
+    assert 'asyncio' not in modules
+    assert 'ctypes' not in modules
+
+def test_lazy_exports():
+
+    import configpp.soil
+
+    for name in configpp.soil.__all__:
+        assert getattr(configpp.soil, name) is not None
+
+    assert 'Config' in dir(configpp.soil)
+    with pytest.raises(AttributeError):
+        configpp.soil.Teve
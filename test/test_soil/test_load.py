@@ -1,5 +1,11 @@
 
-from configpp.soil import Config, Group, GroupMember, Transport, ClimberLocation
+import asyncio
+import mmap
+from collections import OrderedDict
+
+import pytest
+
+from configpp.soil import Config, Group, GroupMember, Transport, ClimberLocation, Location, JSONTransform, YamlTransform, FastYamlTransform
 from voidpp_tools.mocks.file_system import FileSystem, mockfs
 
 
@@ -156,3 +162,50 @@ def test_load_group_climber_loc():
     assert logger.data == {"b": 42}
     assert grp.path == '/home/douglas/teve/test1'
     assert core.path == '/home/douglas/teve/test1/core.json'
+
+
+@pytest.mark.parametrize('threshold, buffer_type', [(0, mmap.mmap), (1024, bytes)])
+def test_location_open_buffer(tmpdir, threshold, buffer_type):
+
+    tmpdir.join(_data_filename).write('{"a": 42}')
+
+    with Location(str(tmpdir), mmap_threshold = threshold).open_buffer(_data_filename) as buffer:
+        assert type(buffer) is buffer_type
+        assert bytes(buffer) == b'{"a": 42}'
+
+def test_location_open_buffer_empty_file(tmpdir):
+
+    tmpdir.join(_data_filename).write('')
+
+    with Location(str(tmpdir), mmap_threshold = 0).open_buffer(_data_filename) as buffer:
+        assert buffer == b''
+
+@pytest.mark.parametrize('name, content, transform, data_type', [
+    ('app.json', '{"b": "\u00e1rv\u00edz", "a": [1, 2]}', JSONTransform(), OrderedDict),
+    ('app.json', '{"b": "\u00e1rv\u00edz", "a": [1, 2]}', JSONTransform(ordered = False), dict),
+    ('app.yaml', 'b: \u00e1rv\u00edz\na:\n- 1\n- 2\n', YamlTransform(), OrderedDict),
+    ('app.yaml', 'b: \u00e1rv\u00edz\na:\n- 1\n- 2\n', FastYamlTransform(), dict),
+])
+@pytest.mark.parametrize('threshold', [0, 1024 * 1024])
+def test_load_bytes_read_path(tmpdir, name, content, transform, data_type, threshold):
+
+    tmpdir.join(name).write_text(content, 'utf-8')
+
+    cfg = Config(name, transform, Transport([Location(str(tmpdir))], mmap_threshold = threshold))
+
+    assert cfg.load() is True
+    assert isinstance(cfg.data, data_type)
+    assert list(cfg.data.items()) == [('b', '\u00e1rv\u00edz'), ('a', [1, 2])]
+
+def test_aload_bytes_read_path(tmpdir):
+
+    tmpdir.join(_data_filename).write('{"a": 42}')
+
+    cfg = Config(_data_filename, transport = Transport([Location(str(tmpdir))], mmap_threshold = 0))
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(cfg.aload()) is True
+    finally:
+        loop.close()
+    assert cfg.data == {"a": 42}
@@ -1,6 +1,8 @@
-
+import os
+from unittest.mock import patch
 from voidpp_tools.mocks.file_system import FileSystem, mockfs
-from configpp.soil.transport import ClimberLocation
+from configpp.soil import Config, Group, GroupMember
+from configpp.soil.transport import ClimberIndex, ClimberLocation, ClimberTransport, Location
 
 _data_filename = 'test1.json'
 
@@ -21,3 +23,133 @@ def test_climber_location_same_folder():
     loc.init_for(_data_filename)
 
     assert loc.target_path(_data_filename) == '/home/douglas/devel/' + _data_filename
+
+@mockfs({'etc': {'app': {'core.json': '{}', 'logger.json': {}}}})
+def test_location_probe():
+
+    loc = Location('/etc')
+
+    assert loc.probe(['app/core.json', 'app/logger.json', 'app/db.json', 'other/core.json']) == {'app/core.json'}
+
+def test_location_probe_lists_folder_once(tmpdir):
+
+    tmpdir.mkdir('app').join('core.json').write('{}')
+    tmpdir.join('app').mkdir('logger.json')
+    loc = Location(str(tmpdir))
+
+    with patch('os.scandir', wraps = os.scandir) as scandir, patch('os.stat', wraps = os.stat) as stat:
+        assert loc.probe(['app/core.json', 'app/logger.json', 'app/db.json']) == {'app/core.json'}
+
+    scandir.assert_called_once_with(str(tmpdir.join('app')))
+    assert stat.call_count == 0
+
+@mockfs({'teve': {'app': {'core.json': '{"a": 1}'}}, 'etc': {'app': {'core.json': '{"a": 2}'}}}, cwd = '/teve')
+def test_group_load_stops_at_first_full_location():
+
+    core = GroupMember('core.json')
+    grp = Group('app', [core])
+
+    with patch.object(Location, 'probe', autospec = True, side_effect = Location.probe) as probe:
+        assert grp.load()
+
+    assert probe.call_count == 1
+    assert core.data == {'a': 1}
+
+@mockfs({'home': {'douglas': {'devel': {'app': {'core.json': '{}', 'logger.json': '{}'}, 'teve': {}}}}})
+def test_climber_location_probe_many_names():
+
+    loc = ClimberLocation('/home/douglas/devel/teve')
+
+    assert loc.probe(['app/core.json', 'app/logger.json', 'app/db.json']) == {'app/core.json', 'app/logger.json'}
+    assert loc.target_path('app/core.json') == '/home/douglas/devel/app/core.json'
+
+@mockfs({'home': {'douglas': {'devel': {_data_filename: '{"a": 84}', 'teve': {}}}}})
+def test_climber_location_memoized():
+
+    loc = ClimberLocation('/home/douglas/devel/teve')
+
+    loc.init_for(_data_filename)
+
+    with patch('os.listdir') as listdir:
+        loc.init_for(_data_filename)
+        ClimberLocation('/home/douglas/devel/teve', index = loc.index).init_for(_data_filename)
+
+    assert listdir.call_count == 0
+
+    loc.invalidate()
+
+    with patch('os.path.isfile', wraps = os.path.isfile) as isfile:
+        loc.init_for(_data_filename)
+
+    # climbed again: a miss in teve and the hit in devel
+    assert isfile.call_count == 2
+
+def test_climber_single_name_is_not_listed(tmpdir):
+
+    start = tmpdir.mkdir('devel').mkdir('teve')
+    tmpdir.join(_data_filename).write('{}')
+    loc = ClimberLocation(str(start))
+
+    with patch('os.listdir', wraps = os.listdir) as listdir, patch('os.scandir', wraps = os.scandir) as scandir:
+        loc.init_for(_data_filename)
+
+    assert loc.target_path(_data_filename) == str(tmpdir.join(_data_filename))
+    assert listdir.call_count == scandir.call_count == 0
+
+@mockfs({'home': {'douglas': {'devel': {'teve': {}}}}})
+def test_climber_index_ttl():
+
+    index = ClimberIndex(ttl = 0, cache_misses = True)
+    loc = ClimberLocation('/home/douglas/devel/teve', index = index)
+
+    loc.init_for(_data_filename)
+    assert loc.valid is False
+
+    with open('/home/douglas/devel/' + _data_filename, 'w') as f:
+        f.write('{}')
+
+    loc.init_for(_data_filename)
+    assert loc.target_path(_data_filename) == '/home/douglas/devel/' + _data_filename
+
+@mockfs({'home': {'douglas': {'devel': {'teve': {}}}}}, cwd = '/home/douglas/devel/teve')
+def test_climber_finds_new_file_after_miss():
+
+    cfg = Config(_data_filename, transport = ClimberTransport())
+
+    assert cfg.load() is False
+
+    with open('/home/douglas/devel/' + _data_filename, 'w') as f:
+        f.write('{"a": 42}')
+
+    assert cfg.load() is True
+    assert cfg.data == {'a': 42}
+
+@mockfs({'home': {'douglas': {'devel': {_data_filename: '{"a": 84}', 'teve': {_data_filename: '{"a": 42}'}}}}})
+def test_climber_memoized_hit_is_checked():
+
+    loc = ClimberLocation('/home/douglas/devel/teve')
+
+    loc.init_for(_data_filename)
+    assert loc.target_path(_data_filename) == '/home/douglas/devel/teve/' + _data_filename
+
+    os.remove('/home/douglas/devel/teve/' + _data_filename)
+
+    loc.init_for(_data_filename)
+    assert loc.target_path(_data_filename) == '/home/douglas/devel/' + _data_filename
+
+@mockfs({'home': {'douglas': {'devel': {'teve': {}}}}})
+def test_climber_index_cache_misses_forever():
+
+    loc = ClimberLocation('/home/douglas/devel/teve', index = ClimberIndex(cache_misses = True))
+
+    loc.init_for(_data_filename)
+
+    with open('/home/douglas/devel/' + _data_filename, 'w') as f:
+        f.write('{}')
+
+    loc.init_for(_data_filename)
+    assert loc.valid is False
+
+    loc.invalidate()
+    loc.init_for(_data_filename)
+    assert loc.valid is True
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+from voidpp_tools.mocks.file_system import mockfs
+
+from configpp.soil import ConfigRegistry, Group, SoilException, create_from_url, normalize_url
+
+_fs = {'etc': {'app.json': '{"a": 42}', 'test1': {'core.json': '{"a": 42}', 'logger.yaml': 'b: 42'}}}
+
+@pytest.mark.parametrize('url, normalized', [
+    ('configpp://app.json', 'configpp://app.json%configpp.soil.transform:JSONTransform/configpp.soil.transport:Transport'),
+    (' configpp://app.yaml#teve ', 'configpp://app.yaml%configpp.soil.transform:YamlTransform/configpp.soil.transport:Transport'),
+    ('configpp://core.json&logger.yaml?@test1', 'configpp://core.json%configpp.soil.transform:JSONTransform&'
+     'logger.yaml?%configpp.soil.transform:YamlTransform@test1/configpp.soil.transport:Transport'),
+])
+def test_normalize_url(url, normalized):
+
+    assert normalize_url(url) == normalized
+    assert normalize_url(normalized) == normalized
+
+@mockfs(_fs)
+def test_registry_shared_handler():
+
+    registry = ConfigRegistry()
+
+    cfg1 = registry.acquire('configpp://app.json')
+    cfg2 = registry.acquire('configpp://app.json%configpp.soil.transform:JSONTransform')
+
+    assert cfg1 is cfg2
+    assert cfg1.data == {"a": 42}
+    assert registry.refcount('configpp://app.json') == 2
+
+@mockfs(_fs)
+def test_registry_group():
+
+    registry = ConfigRegistry()
+
+    with registry.use('configpp://core.json&logger.yaml@test1') as grp:
+        assert isinstance(grp, Group)
+        assert grp.members['logger.yaml'].data == {"b": 42}
+
+    assert registry.refcount('configpp://core.json&logger.yaml@test1') == 0
+
+@mockfs(_fs)
+def test_registry_release_drops_handler():
+
+    registry = ConfigRegistry()
+
+    cfg1 = registry.acquire('configpp://app.json')
+    registry.release('configpp://app.json')
+
+    assert 'configpp://app.json' not in registry
+    assert registry.acquire('configpp://app.json') is not cfg1
+
+@mockfs(_fs)
+def test_registry_invalidate():
+
+    registry = ConfigRegistry()
+
+    cfg1 = registry.acquire('configpp://app.json')
+    registry.invalidate('configpp://app.json')
+    cfg2 = registry.acquire('configpp://app.json')
+
+    assert cfg1 is not cfg2
+    assert registry.refcount('configpp://app.json') == 1
+
+@mockfs(_fs)
+def test_registry_not_found():
+
+    registry = ConfigRegistry()
+
+    with pytest.raises(SoilException):
+        registry.acquire('configpp://teve.json')
+
+    assert registry.refcount('configpp://teve.json') == 0
+
+def test_registry_concurrent_first_acquire():
+
+    created = []
+
+    def factory(url):
+        created.append(url)
+        config = create_from_url(url)
+        config.load = lambda: time.sleep(0.1) or True
+        return config
+
+    registry = ConfigRegistry(factory)
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(registry.acquire('configpp://app.json'))) for _ in range(8)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert len(set(map(id, results))) == 1
+    assert registry.refcount('configpp://app.json') == 8
+
+@mockfs(_fs)
+def test_registry_use_across_invalidate():
+
+    registry = ConfigRegistry()
+
+    with registry.use('configpp://app.json') as cfg1:
+        registry.invalidate()
+        cfg2 = registry.acquire('configpp://app.json')
+
+    assert cfg1 is not cfg2
+    assert registry.refcount('configpp://app.json') == 1
+
+@mockfs(_fs)
+def test_registry_handle_releases_its_own_entry():
+
+    registry = ConfigRegistry()
+
+    handle = registry.acquire_handle('configpp://app.json')
+    registry.invalidate('configpp://app.json')
+    cfg2 = registry.acquire('configpp://app.json')
+
+    handle.release()
+    handle.release()
+
+    assert handle.config is not cfg2
+    assert registry.refcount('configpp://app.json') == 1
+    assert registry.acquire('configpp://app.json') is cfg2
@@ -0,0 +1,134 @@
+import os
+from unittest.mock import patch
+
+from configpp.soil import Group, GroupMember, Location, Transport
+from configpp.soil.cache import stat_key
+
+def create_group(tmpdir, members, **kwargs):
+    return Group('test1', members, transport = Transport([Location(str(tmpdir.join('etc'))), Location(str(tmpdir.join('home')))]),
+                 **kwargs)
+
+def bump_mtime(path):
+    st = os.stat(str(path))
+    os.utime(str(path), ns = (st.st_atime_ns, st.st_mtime_ns + 1000000000))
+
+def test_reload_changed_member_only(tmpdir):
+
+    folder = tmpdir.mkdir('etc').mkdir('test1')
+    members = []
+    for idx in range(50):
+        folder.join('m{}.json'.format(idx)).write('{"a": %d}' % idx)
+        members.append(GroupMember('m{}.json'.format(idx)))
+    grp = create_group(tmpdir, members)
+    assert grp.load()
+
+    folder.join('m7.json').write('{"a": 4242}')
+    bump_mtime(folder.join('m7.json'))
+
+    with patch.object(Location, 'read_with_key', autospec = True, side_effect = Location.read_with_key) as read:
+        assert grp.reload() == [members[7]]
+
+    assert read.call_count == 1
+    assert members[7].data == {"a": 4242}
+
+def test_reload_not_changed(tmpdir):
+
+    folder = tmpdir.mkdir('etc').mkdir('test1')
+    folder.join('core.json').write('{"a": 42}')
+    core = GroupMember('core.json')
+    grp = create_group(tmpdir, [core])
+    assert grp.load()
+
+    with patch.object(Location, 'read_with_key', autospec = True, side_effect = Location.read_with_key) as read:
+        assert grp.reload() == []
+
+    assert read.call_count == 0
+
+def test_reload_touched_with_hash_content(tmpdir):
+
+    folder = tmpdir.mkdir('etc').mkdir('test1')
+    folder.join('core.json').write('{"a": 42}')
+    core = GroupMember('core.json')
+    grp = create_group(tmpdir, [core], hash_content = True)
+    assert grp.load()
+    core.data['a'] = 84
+
+    bump_mtime(folder.join('core.json'))
+
+    assert grp.reload() == []
+    assert core.data == {"a": 84}
+
+    folder.join('core.json').write('{"a": 4200}')
+    bump_mtime(folder.join('core.json'))
+
+    assert grp.reload() == [core]
+    assert core.data == {"a": 4200}
+
+def test_reload_new_and_removed_optional_member(tmpdir):
+
+    folder = tmpdir.mkdir('etc').mkdir('test1')
+    folder.join('core.json').write('{"a": 42}')
+    core = GroupMember('core.json')
+    logger = GroupMember('logger.json', mandatory = False)
+    grp = create_group(tmpdir, [core, logger])
+    assert grp.load()
+    assert not logger.is_loaded
+
+    folder.join('logger.json').write('{"b": 42}')
+
+    assert grp.reload() == [logger]
+    assert logger.data == {"b": 42}
+
+    os.remove(str(folder.join('logger.json')))
+
+    assert grp.reload() == [logger]
+    assert not logger.is_loaded
+    assert core.data == {"a": 42}
+
+def test_reload_select_other_location(tmpdir):
+
+    tmpdir.mkdir('etc')
+    folder = tmpdir.mkdir('home').mkdir('test1')
+    folder.join('core.json').write('{"a": 42}')
+    core = GroupMember('core.json')
+    grp = create_group(tmpdir, [core])
+    assert grp.load()
+
+    tmpdir.join('etc').mkdir('test1').join('core.json').write('{"a": 84}')
+
+    # the set of the files of the current location is not changed
+    assert grp.reload() == []
+
+    os.remove(str(folder.join('core.json')))
+
+    assert grp.reload() == [core]
+    assert core.data == {"a": 84}
+    assert grp.location.target_path('test1') == str(tmpdir.join('etc', 'test1'))
+
+def test_reload_not_loaded_group(tmpdir):
+
+    folder = tmpdir.mkdir('etc').mkdir('test1')
+    folder.join('core.json').write('{"a": 42}')
+    core = GroupMember('core.json')
+    logger = GroupMember('logger.json', mandatory = False)
+    grp = create_group(tmpdir, [core, logger])
+
+    assert grp.reload() == [core]
+    assert core.data == {"a": 42}
+
+def test_load_takes_the_fingerprints_from_the_read(tmpdir):
+
+    folder = tmpdir.mkdir('etc').mkdir('test1')
+    members = []
+    for idx in range(3):
+        folder.join('m{}.json'.format(idx)).write('{"a": %d}' % idx)
+        members.append(GroupMember('m{}.json'.format(idx)))
+    grp = create_group(tmpdir, members)
+
+    with patch('os.stat', wraps = os.stat) as stat:
+        assert grp.load()
+
+    member_paths = set(str(folder.join(member.name)) for member in members)
+    assert not [call for call in stat.call_args_list if str(call[0][0]) in member_paths]
+    assert grp.fingerprints['test1/m1.json'].stat == stat_key(os.stat(str(folder.join('m1.json'))))
+    assert grp.reload() == []
@@ -1,7 +1,14 @@
 
 import pytest
 from collections import OrderedDict
-from configpp.soil.transform import JSONTransform, YamlTransform
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from ruamel.yaml.representer import RoundTripRepresenter
+
+import json
+
+from configpp.soil.transform import JSONTransform, YamlTransform, FastYamlTransform, TransformException, get_json_backends
 
 @pytest.mark.parametrize('data, keys', [
     ('{"a":7, "k":8, "b": 42}', ['a', 'k', 'b']),
@@ -54,3 +61,129 @@ def test_dump_yaml_ordered(data, res):
     transform = YamlTransform()
 
     assert transform.serialize(data) == res
+
+@pytest.mark.parametrize('data, keys', [
+    ('f: 7\ne: 8\n42: a', ['f', 'e', 42]),
+    ('o: 7\na: 8\nr: 42', ['o', 'a', 'r']),
+])
+def test_load_fast_yaml_ordered(data, keys):
+
+    res = FastYamlTransform().deserialize(data)
+
+    assert type(res) is dict
+    assert list(res.keys()) == keys
+
+@pytest.mark.parametrize('data, res', [
+    (OrderedDict([("a",7), ("k",8), ("b", 42)]), "a: 7\nk: 8\nb: 42\n"),
+    ({"r": 7, "8": {"b": [42]}}, "r: 7\n'8':\n  b:\n  - 42\n"),
+])
+def test_dump_fast_yaml(data, res):
+
+    assert FastYamlTransform().serialize(data) == res
+
+@pytest.mark.parametrize('data, res', [
+    ('a: on', {'a': 'on'}),
+    ('a: 0777', {'a': 777}),
+    ('a: 1:20', {'a': '1:20'}),
+    ('a: 0o17', {'a': 15}),
+])
+def test_fast_yaml_parses_like_yaml(data, res):
+
+    assert FastYamlTransform().deserialize(data) == YamlTransform().deserialize(data) == res
+
+def test_fast_yaml_is_safe():
+
+    with pytest.raises(Exception):
+        FastYamlTransform().deserialize('!!python/object/apply:os.system ["ls"]')
+
+@pytest.mark.parametrize('transform', [JSONTransform(), YamlTransform(), FastYamlTransform()])
+def test_serialize_to_stream(transform):
+
+    data = OrderedDict([("a", 7), ("b", [1, {"c": "d"}])])
+    stream = StringIO()
+
+    transform.serialize_to(data, stream)
+
+    assert stream.getvalue() == transform.serialize(data)
+
+def test_yaml_serialize_does_not_change_ruamel_representers():
+
+    representers = dict(RoundTripRepresenter.yaml_representers)
+
+    YamlTransform().serialize(OrderedDict([("a", 7)]))
+
+    assert RoundTripRepresenter.yaml_representers == representers
+
+def test_yaml_engine_per_thread():
+
+    transform = YamlTransform()
+    data = [OrderedDict([("t{}".format(t), list(range(t)))]) for t in range(8)]
+
+    with ThreadPoolExecutor(max_workers = 8) as executor:
+        results = list(executor.map(lambda d: transform.deserialize(transform.serialize(d)), data * 10))
+        other_thread_engine = executor.submit(lambda: transform.engine).result()
+
+    assert results == data * 10
+    assert transform.engine is transform.engine
+    assert other_thread_engine is not transform.engine
+
+_json_corpus = [
+    '{"a": 7, "k": 8.5, "b": [1, 2, {"c": null}]}',
+    '{"z": true, "y": false, "x": "\\u00e1rv\\u00edz", "w": "\\n\\t\\"", "v": -0.0001, "u": 1e20}',
+    '[]',
+    '{}',
+    '{"nested": {"nested": {"nested": [[], {}, ""]}}}',
+    '"\u00e9kezet"',
+    '42',
+    '{"big": 18446744073709551616, "small": -9223372036854775809, "long": 1234567890123456789}',
+    '[NaN, Infinity, -Infinity, 1e400]',
+    '{"a": "\\ud800", "\\udfff": 1}',
+]
+
+@pytest.mark.parametrize('backend', list(get_json_backends().values()), ids = lambda b: b.name)
+@pytest.mark.parametrize('raw', _json_corpus)
+def test_json_backend_conformance(backend, raw):
+
+    data = json.loads(raw)
+
+    if backend.loads is not None:
+        res = backend.loads(raw)
+        # the NaN is not equal to itself, the dumped forms are compared instead
+        assert json.dumps(res) == json.dumps(data)
+        assert type(res) is type(data)
+    if backend.dumps is not None:
+        assert backend.dumps(data) == json.dumps(data)
+
+@pytest.mark.parametrize('backend', list(get_json_backends()))
+@pytest.mark.parametrize('raw', _json_corpus[-3:-1])
+def test_json_transform_buffer_conformance(backend, raw):
+
+    res = JSONTransform(ordered = False, backend = backend).deserialize_bytes(raw.encode())
+
+    assert json.dumps(res) == json.dumps(json.loads(raw))
+
+def test_json_transform_default_backend_is_stdlib():
+
+    assert JSONTransform()._decoder.name == 'json'
+
+@pytest.mark.parametrize('backend', list(get_json_backends()))
+def test_json_transform_backends_raise_value_error(backend):
+
+    with pytest.raises(ValueError):
+        JSONTransform(backend = backend).deserialize('{"a": ')
+
+def test_json_transform_unordered():
+
+    transform = JSONTransform(ordered = False)
+
+    res = transform.deserialize('{"b": 1, "a": {"d": 2, "c": 3}}')
+
+    assert type(res) is dict
+    assert type(res['a']) is dict
+    assert res == {"b": 1, "a": {"d": 2, "c": 3}}
+    assert transform.cache_key != JSONTransform().cache_key
+
+def test_json_transform_unknown_backend():
+
+    with pytest.raises(TransformException):
+        JSONTransform(backend = 'teve')
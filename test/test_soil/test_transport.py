@@ -0,0 +1,108 @@
+import threading
+import time
+from voidpp_tools.mocks.file_system import mockfs
+from configpp.soil import Config, Group, GroupMember, Location, Transport
+
+_data = {'test1.json': '{"a": 42}'}
+
+class SlowLocation(Location):
+
+    def __init__(self, base_path: str, delay: float):
+        super().__init__(base_path)
+        self._delay = delay
+
+    def probe(self, paths):
+        time.sleep(self._delay)
+        return super().probe(paths)
+
+@mockfs({'etc': _data, 'home': {'douglas': {'test1.json': '{"a": 84}'}}})
+def test_concurrent_transport_keeps_priority():
+
+    transport = Transport([SlowLocation('/home/douglas', 0.1), Location('/etc')], concurrent = True)
+
+    cfg = Config('test1.json', transport = transport)
+
+    assert cfg.load()
+    assert cfg.data == {'a': 84}
+
+@mockfs({'etc': _data, 'home': {'douglas': {'test1.json': '{"a": 84}'}}})
+def test_concurrent_transport_skips_timed_out_location():
+
+    transport = Transport([SlowLocation('/home/douglas', 0.5), Location('/etc')], concurrent = True, probe_timeout = 0.05)
+
+    cfg = Config('test1.json', transport = transport)
+
+    assert cfg.load()
+    assert cfg.data == {'a': 42}
+
+@mockfs({'etc': {'app': {'core.json': '{"a": 42}'}}})
+def test_concurrent_transport_group():
+
+    transport = Transport([SlowLocation('/home/douglas', 0.05), Location('/var'), Location('/etc')], concurrent = True)
+
+    core = GroupMember('core.json')
+    grp = Group('app', [core], transport)
+
+    assert grp.load()
+    assert core.data == {'a': 42}
+
+@mockfs({'etc': _data})
+def test_transport_find():
+
+    transport = Transport([Location('/var'), Location('/etc')])
+
+    assert transport.find('test1.json') is transport.locations[1]
+    assert transport.find('test2.json') is None
+
+class HungLocation(Location):
+
+    def __init__(self, base_path: str):
+        super().__init__(base_path)
+        self.release = threading.Event()
+        self.calls = 0
+
+    def init_for(self, path):
+        self.calls += 1
+        self.release.wait()
+
+    def probe(self, paths):
+        self.calls += 1
+        self.release.wait()
+        return super().probe(paths)
+
+@mockfs({'etc': _data})
+def test_concurrent_transport_does_not_pile_up_stuck_calls():
+
+    hung = HungLocation('/home/douglas')
+    transport = Transport([hung, Location('/etc')], concurrent = True, probe_timeout = 0.2)
+
+    try:
+        for _ in range(5):
+            assert transport.find('test1.json') is transport.locations[1]
+
+        assert hung.calls == 1
+        assert all(thread.daemon for thread in threading.enumerate() if thread.name.startswith('configpp-probe'))
+    finally:
+        hung.release.set()
+
+    time.sleep(0.05)
+
+    assert transport.find('test1.json') is transport.locations[1]
+    assert hung.calls == 2
+
+@mockfs({'a': {'app.json': '{"a": 1}'}, 'b': {'app.json': '{"a": 2}'}})
+def test_concurrent_transport_shared_between_threads_keeps_priority():
+
+    transport = Transport([SlowLocation('/a', 0.1), Location('/b')], concurrent = True)
+    results = []
+
+    def find():
+        results.append(transport.find('app.json'))
+
+    threads = [threading.Thread(target = find) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [transport.locations[0]] * 4
@@ -2,9 +2,9 @@
 from pytest import raises, mark
 from unittest.mock import patch
 
-from configpp.soil import JSONTransform, YamlTransform, Transport, Config, GroupMember
+from configpp.soil import JSONTransform, YamlTransform, FastYamlTransform, Transport, Config, GroupMember
 
-from configpp.soil.utils import create_from_url, SoilUriParserException, Config, Group
+from configpp.soil.utils import create_from_url, parse_url, SoilUriParserException, Config, Group
 
 def test_very_simple_uri():
 
@@ -111,3 +111,33 @@ def test_guessing_in_ctors(filename, transform):
 
     assert isinstance(Config(filename).transform, transform)
     assert isinstance(GroupMember(filename).transform, transform)
+
+def test_uri_with_fast_yaml_transform():
+
+    cfg = create_from_url('configpp://app.yaml%configpp.soil.transform:FastYamlTransform')
+
+    assert isinstance(cfg.transform, FastYamlTransform)
+
+def test_parsed_url_is_cached():
+
+    url = 'configpp://core.json&logger.yaml?@app'
+
+    spec = parse_url(url)
+
+    assert parse_url(url) is spec
+    assert spec.group_name == 'app'
+    assert [member.mandatory for member in spec.members] == [True, False]
+    with raises(AttributeError):
+        spec.group_name = 'teve'
+
+def test_spec_creates_new_handlers():
+
+    spec = parse_url('configpp://app.json')
+
+    cfg1 = spec.create()
+    cfg2 = spec.create()
+
+    assert cfg1 is not cfg2
+    assert cfg1.transform is not cfg2.transform
+    assert isinstance(cfg1.transform, JSONTransform)
+    assert parse_url(spec.url).url == spec.url
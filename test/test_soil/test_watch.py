@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from configpp.soil import Config, Group, GroupMember, Location, Transport, SoilException, Durability
+from configpp.soil.watch import Watcher, inotify_available
+
+backends = [
+    pytest.param(True, id = 'inotify', marks = pytest.mark.skipif(not inotify_available(), reason = 'no inotify')),
+    pytest.param(False, id = 'poll'),
+]
+
+class Recorder():
+
+    def __init__(self):
+        self.calls = []
+        self.event = threading.Event()
+
+    def __call__(self, config, reloaded):
+        self.calls.append(reloaded)
+        self.event.set()
+
+    def wait(self):
+        assert self.event.wait(5)
+        self.event.clear()
+
+@pytest.mark.parametrize('use_inotify', backends)
+def test_watch_config(tmpdir, use_inotify):
+
+    tmpdir.join('app.json').write('{"a": 42}')
+    cfg = Config('app.json', transport = Transport([Location(str(tmpdir))]))
+    assert cfg.load()
+    recorder = Recorder()
+
+    with cfg.watch(recorder, debounce = 0.05, poll_interval = 0.02, use_inotify = use_inotify):
+        tmpdir.join('app.json').write('{"a": 4200}')
+        recorder.wait()
+
+    assert cfg.data == {"a": 4200}
+    assert recorder.calls == [[cfg]]
+
+@pytest.mark.parametrize('use_inotify', backends)
+def test_watch_config_atomic_write(tmpdir, use_inotify):
+
+    tmpdir.join('app.json').write('{"a": 42}')
+    cfg = Config('app.json', transport = Transport([Location(str(tmpdir))], durability = Durability()))
+    assert cfg.load()
+    recorder = Recorder()
+
+    with cfg.watch(recorder, debounce = 0.05, poll_interval = 0.02, use_inotify = use_inotify):
+        cfg.location.write('app.json', '{"a": 4200}')
+        recorder.wait()
+
+    assert cfg.data == {"a": 4200}
+
+@pytest.mark.parametrize('use_inotify', backends)
+def test_watch_coalesce_changes(tmpdir, use_inotify):
+
+    tmpdir.join('app.json').write('{"a": 42}')
+    cfg = Config('app.json', transport = Transport([Location(str(tmpdir))]))
+    assert cfg.load()
+    recorder = Recorder()
+
+    with cfg.watch(recorder, debounce = 0.3, poll_interval = 0.02, use_inotify = use_inotify):
+        for value in range(5):
+            tmpdir.join('app.json').write('{"a": %s}' % ('1' * (value + 1)))
+            time.sleep(0.05)
+        recorder.wait()
+
+    assert cfg.data == {"a": 11111}
+    assert len(recorder.calls) == 1
+
+@pytest.mark.parametrize('use_inotify', backends)
+def test_watch_group_reload_changed_members(tmpdir, use_inotify):
+
+    folder = tmpdir.mkdir('test1')
+    folder.join('core.json').write('{"a": 42}')
+    folder.join('logger.json').write('{"b": 42}')
+    core = GroupMember('core.json')
+    logger = GroupMember('logger.json')
+    grp = Group('test1', [core, logger], transport = Transport([Location(str(tmpdir))]))
+    assert grp.load()
+    logger.data['b'] = 84
+    recorder = Recorder()
+
+    with grp.watch(recorder, debounce = 0.05, poll_interval = 0.02, use_inotify = use_inotify):
+        folder.join('core.json').write('{"a": 4200}')
+        recorder.wait()
+
+    assert recorder.calls == [[core]]
+    assert core.data == {"a": 4200}
+    # not reloaded
+    assert logger.data == {"b": 84}
+
+def test_watch_handler_error_does_not_stop_the_watcher(tmpdir):
+
+    file = tmpdir.join('app.json')
+    path = str(file)
+    file.write('1')
+    called = threading.Event()
+    calls = []
+
+    def handler(changed):
+        calls.append(changed)
+        if len(calls) == 1:
+            raise Exception("teve")
+        called.set()
+
+    with Watcher([path], handler, debounce = 0.05, poll_interval = 0.02, use_inotify = False) as watcher:
+        file.write('12')
+        time.sleep(0.2)
+        file.write('123')
+        assert called.wait(5)
+        assert watcher.running
+
+    assert calls == [{path}, {path}]
+
+def test_watch_stop(tmpdir):
+
+    file = tmpdir.join('app.json')
+    path = str(file)
+    file.write('1')
+
+    watcher = Watcher([path], lambda changed: None, poll_interval = 10)
+    watcher.stop(5)
+
+    assert not watcher.running
+
+@pytest.mark.parametrize('use_inotify', backends)
+def test_watch_stop_twice(tmpdir, use_inotify):
+
+    file = tmpdir.join('app.json')
+    path = str(file)
+    file.write('1')
+
+    with Watcher([path], lambda changed: None, poll_interval = 10, use_inotify = use_inotify) as watcher:
+        watcher.stop(5)
+        assert not watcher.running
+
+        # the closed fds of the watcher can be reused by any file, nothing must be written into them
+        with patch('os.write', wraps = os.write) as os_write:
+            watcher.stop(5)
+            watcher.backend.interrupt()
+
+    watcher.stop(5)
+
+    assert os_write.call_count == 0
+    assert not watcher.running
+
+def test_watch_not_loaded():
+
+    with pytest.raises(SoilException):
+        Config('app.json').watch(lambda config, reloaded: None)
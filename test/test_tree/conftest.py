@@ -0,0 +1,29 @@
+from pytest import fixture
+
+from configpp.tree import Settings
+
+@fixture(autouse = True, params = [False, True], ids = ['interpreted', 'compiled'])
+def compile_nodes(request, monkeypatch):
+    """Run every tree test with and without the compiled nodes"""
+    original_init = Settings.__init__
+
+    def init(self, *args, **kwargs):
+        kwargs.setdefault('compile_nodes', request.param)
+        original_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(Settings, '__init__', init)
+
+    return request.param
+
+@fixture(autouse = True, params = [False, True], ids = ['dict', 'compact'])
+def compact_nodes(request, monkeypatch):
+    """Run every tree test with the plain and with the compact node instances"""
+    original_init = Settings.__init__
+
+    def init(self, *args, **kwargs):
+        kwargs.setdefault('compact_nodes', request.param)
+        original_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(Settings, '__init__', init)
+
+    return request.param
@@ -0,0 +1,110 @@
+from pytest import mark, raises
+from configpp.tree import Tree, Settings, NodeBase
+from configpp.tree.exceptions import ConfigTreeDumpException
+from typing import List
+from voluptuous import MultipleInvalid
+
+class ServerConfig(NodeBase):
+
+    host = str
+    port = 42
+
+class FileRoute(NodeBase):
+
+    kind = 'file'
+    path = str
+
+class HttpRoute(NodeBase):
+
+    kind = 'http'
+    host = str
+
+def create_tree(compile_nodes):
+
+    tree = Tree(Settings(compile_nodes = compile_nodes, convert_underscores_to_hypens = True))
+
+    @tree.root()
+    class Config():
+
+        app_name = str
+        servers = tree.list_node([ServerConfig])
+        limits = tree.dict_node(str, int)
+        mixed = tree.list_node([ServerConfig, int], default = [])
+        routes = tree.list_node([FileRoute, HttpRoute], default = [], discriminator = 'kind')
+
+    return tree
+
+def get_errors(tree, data):
+    with raises(MultipleInvalid) as info:
+        tree.load(data)
+    return sorted(str(err) for err in info.value.errors)
+
+_invalid_data = [
+    {},
+    {'app-name': 42, 'servers': [], 'limits': {}},
+    {'app-name': 'teve', 'servers': [{'port': 'muha'}], 'limits': {}},
+    {'app-name': 'teve', 'servers': [{'host': 'a'}], 'limits': {'k1': 'v1', 42: 1}},
+    {'app-name': 'teve', 'servers': 42, 'limits': [], 'extra': 1},
+    {'app-name': 'teve', 'servers': [], 'limits': {}, 'mixed': ['muha']},
+    {'app-name': 'teve', 'servers': [], 'limits': {}, 'mixed': [{'host': 42}, {'port': 1}]},
+    {'app-name': 'teve', 'servers': [], 'limits': {}, 'routes': [{'kind': 'ftp'}, {'path': 'a'}, 42]},
+    {'app-name': 'teve', 'servers': [], 'limits': {}, 'routes': [{'kind': 'http', 'path': 'a'}]},
+    {'app-name': 'teve', 'servers': [], 'limits': {}, 'routes': {}},
+    42,
+]
+
+@mark.parametrize('data', _invalid_data)
+def test_compiled_errors_are_same_as_interpreted(data):
+
+    assert get_errors(create_tree(True), data) == get_errors(create_tree(False), data)
+
+@mark.parametrize('data', _invalid_data)
+def test_load_errors_are_same_as_schema(data, compile_nodes):
+    tree = create_tree(compile_nodes)
+
+    with raises(MultipleInvalid) as info:
+        tree.build_schema()(data)
+
+    assert get_errors(tree, data) == sorted(str(err) for err in info.value.errors)
+
+def test_compiled_load_and_dump():
+
+    tree = create_tree(True)
+
+    cfg = tree.load({'app-name': 'teve', 'servers': [{'host': 'a'}], 'limits': {'k1': 1}, 'mixed': [{'host': 'b', 'port': 1}, 2]})
+
+    assert cfg.servers[0].port == 42
+    assert cfg.mixed[0].host == 'b'
+    assert cfg.mixed[1] == 2
+
+    with raises(ConfigTreeDumpException):
+        tree.dump(cfg)
+
+def test_compiled_dump():
+
+    tree = Tree(Settings(compile_nodes = True, dump_method_name_in_node_classes = 'dump'))
+
+    @tree.root()
+    class Config():
+
+        servers = tree.dict_node(str, ServerConfig)
+        ports = List[int]
+
+    cfg = tree.load({'servers': {'s1': {'host': 'a'}}, 'ports': [1, 2]})
+    cfg.servers['s1'].port = 84
+
+    assert cfg.dump() == {'servers': {'s1': {'host': 'a', 'port': 84}}, 'ports': [1, 2]}
+
+def test_compiled_source_is_regenerated_after_invalidate():
+
+    tree = create_tree(True)
+    tree.build_schema()
+
+    source = tree._compiled.source
+
+    assert 'def load_0(path, value):' in source
+
+    tree.invalidate_schema()
+    tree.build_schema()
+
+    assert tree._compiled.source == source
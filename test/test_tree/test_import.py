@@ -0,0 +1,32 @@
+import subprocess
+import sys
+
+# seconds, the import of the tree (with voluptuous) takes about 0.05 s on a developer machine
+IMPORT_TIME_BUDGET = 0.25
+
+_code = '''
+import sys, time
+start = time.perf_counter()
+from configpp.tree import Tree
+elapsed = time.perf_counter() - start
+print(elapsed, ' '.join(sys.modules))
+'''
+
+def import_tree():
+    elapsed, *modules = subprocess.check_output([sys.executable, '-c', _code]).decode().split()
+    return float(elapsed), set(modules)
+
+def test_import_does_not_import_the_optional_dependencies():
+
+    _, modules = import_tree()
+
+    assert 'dateutil' not in modules
+    assert 'typing_inspect' not in modules
+    assert 'configpp.tree.compiler' not in modules
+
+def test_import_time_budget():
+
+    # the best of a few runs, to be less sensitive to the load of the machine
+    elapsed = min(import_tree()[0] for _ in range(3))
+
+    assert elapsed < IMPORT_TIME_BUDGET
@@ -1,6 +1,7 @@
 
 from pytest import mark, raises
 from configpp.tree import Tree, NodeBase, LeafFactory
+from configpp.tree.exceptions import ConfigTreeBuilderException
 from typing import List, Dict
 from voluptuous import MultipleInvalid
 
@@ -176,3 +177,90 @@ def test_pure_leaf_factory():
 
     with raises(MultipleInvalid):
         assert tree.load({'var1': 'teve'})
+
+def create_tagged_tree(discriminator = 'kind'):
+
+    class HttpRoute(NodeBase):
+        kind = 'http'
+        host = str
+        port = 80
+
+    class FileRoute(NodeBase):
+        kind = 'file'
+        path = str
+
+    tree = Tree()
+
+    @tree.root()
+    class Config():
+
+        routes = tree.list_node([HttpRoute, FileRoute], discriminator = discriminator)
+
+    return tree, HttpRoute, FileRoute
+
+def test_list_node_load_with_discriminator():
+
+    tree, HttpRoute, FileRoute = create_tagged_tree()
+
+    cfg = tree.load({'routes': [{'kind': 'file', 'path': '/tmp'}, {'kind': 'http', 'host': 'teve'}]})
+
+    assert isinstance(cfg.routes[0], FileRoute)
+    assert cfg.routes[0].path == '/tmp'
+    assert isinstance(cfg.routes[1], HttpRoute)
+    assert cfg.routes[1].port == 80
+
+def test_list_node_discriminator_errors():
+
+    tree = create_tagged_tree()[0]
+
+    with raises(MultipleInvalid) as info:
+        tree.load({'routes': [{'kind': 'ftp', 'path': '/tmp'}, {'path': '/tmp'}, 42]})
+
+    assert sorted(str(err) for err in info.value.errors) == [
+        "expected a dictionary @ data['routes'][2]",
+        "not a valid value @ data['routes'][0]['kind']",
+        "required key not provided @ data['routes'][1]['kind']",
+    ]
+
+def test_list_node_discriminator_needs_tag():
+
+    with raises(ConfigTreeBuilderException):
+        create_tagged_tree('type')[0].build_schema()
+
+def test_list_node_routes_by_keys_and_types():
+
+    class ServerConfig(NodeBase):
+        host = str
+        port = 42
+
+    class SocketConfig(NodeBase):
+        path = str
+        port = 42
+
+    tree = Tree()
+    factory = tree.list_node([ServerConfig, SocketConfig, int, str])
+
+    @tree.root()
+    class Config():
+
+        items = factory
+
+    values = [{'path': '/run/teve'}, 'muha', {'host': 'teve', 'port': 1}, 42]
+
+    cfg = tree.load({'items': values})
+
+    assert [factory.route(value) for value in values] == [1, 3, 0, 2]
+    # the shared keys do not decide, these values are tried with every item
+    assert factory.route({'port': 1}) is None
+
+    assert isinstance(cfg.items[0], SocketConfig)
+    assert cfg.items[1] == 'muha'
+    assert isinstance(cfg.items[2], ServerConfig)
+    assert cfg.items[2].port == 1
+    assert cfg.items[3] == 42
+
+    # the key of the other node is an extra key
+    with raises(MultipleInvalid) as info:
+        tree.load({'items': [{'host': 'teve', 'path': '/run/teve'}]})
+
+    assert str(info.value) == "extra keys not allowed @ data['items'][0]['path']"
@@ -0,0 +1,80 @@
+import multiprocessing
+
+from pytest import mark
+from configpp.tree import Settings, Tree
+from voluptuous import MultipleInvalid
+
+# the process pool sends back the instances pickled, so the node class must be importable
+class Tenant():
+    name = str
+    limit = 10
+
+def create_tree():
+    tree = Tree()
+    tree.root()(Tenant)
+    return tree
+
+def create_items(count: int):
+    items = [{'name': 'tenant{}'.format(idx), 'limit': idx} for idx in range(count)]
+    items[3] = {'name': 42}
+    items[7] = {'limit': 1}
+    return items
+
+def check_results(results: list, count: int):
+    assert [result.index for result in results] == list(range(count))
+    for result in results:
+        if result.index in (3, 7):
+            assert result.value is None
+            assert isinstance(result.error, MultipleInvalid)
+        else:
+            assert result.error is None
+            assert isinstance(result.value, Tenant)
+            assert result.value.name == 'tenant{}'.format(result.index)
+            assert result.value.limit == result.index
+
+def test_load_many_in_current_thread():
+
+    results = list(create_tree().load_many(create_items(20), workers = 1, chunksize = 3))
+
+    check_results(results, 20)
+    assert results[3].error.path == ['name']
+
+@mark.parametrize('use_processes', [False, True], ids = ['threads', 'processes'])
+def test_load_many_in_pool(use_processes):
+    if use_processes and 'fork' not in multiprocessing.get_all_start_methods():
+        return
+
+    results = list(create_tree().load_many(iter(create_items(50)), workers = 3, chunksize = 4, use_processes = use_processes))
+
+    check_results(results, 50)
+    assert results[7].error.path == ['name']
+
+def test_load_many_builds_the_schema_once():
+    tree = create_tree()
+
+    list(tree.load_many(create_items(10), workers = 2, chunksize = 2, use_processes = False))
+
+    assert tree.schema_cache_info().misses == 1
+
+def test_load_many_empty():
+
+    assert list(create_tree().load_many([], workers = 2)) == []
+
+class Server():
+    host = str
+    port = 80
+
+def test_load_many_in_processes_with_dump_method():
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return
+
+    tree = Tree(Settings(dump_method_name_in_node_classes = 'dump'))
+    tree.root()(Server)
+    items = [{'host': 'teve{}'.format(idx)} for idx in range(10)]
+    items[4] = {'port': 'muha'}
+
+    results = list(tree.load_many(items, workers = 2, chunksize = 3))
+
+    assert [result.index for result in results] == list(range(10))
+    assert isinstance(results[4].error, MultipleInvalid)
+    assert results[5].value.dump() == {'host': 'teve5', 'port': 80}
@@ -1,5 +1,5 @@
 from pytest import raises, mark
-from configpp.tree import Tree, ConfigTreeBuilderException, NodeBase
+from configpp.tree import Tree, ConfigTreeBuilderException, NodeBase, LeafFactory
 from copy import deepcopy
 from typing import List, Dict
 
@@ -468,3 +468,117 @@ def test_list_root_without_class():
 
     schema = tree.build_schema()
     assert schema([1])
+
+def test_schema_is_cached_between_loads():
+
+    tree = Tree()
+
+    @tree.root()
+    class Config():
+
+        param = int
+
+    schema = tree.build_schema()
+
+    assert tree.load({'param': 42}).param == 42
+    assert tree.load({'param': 84}).param == 84
+    assert tree.build_schema() is schema
+    assert tree.schema_cache_info() == (3, 1)
+
+def test_schema_cache_invalidated_by_set_root():
+
+    tree = Tree()
+
+    tree.set_root(tree.list_node([int]))
+    schema = tree.build_schema()
+
+    tree.set_root(tree.list_node([str]))
+
+    assert tree.build_schema() is not schema
+    assert tree.build_schema()(['teve']) == ['teve']
+    assert tree.schema_cache_info() == (1, 2)
+
+def test_schema_cache_invalidated_by_register_leaf_factory():
+
+    class Point():
+        pass
+
+    class PointLeafFactory(LeafFactory):
+        def create_schema(self):
+            return str
+
+    tree = Tree()
+
+    @tree.root()
+    class Config():
+
+        param = Point
+
+    with raises(MultipleInvalid):
+        tree.load({'param': 'teve'})
+
+    tree.register_leaf_factory(Point, PointLeafFactory)
+
+    assert tree.load({'param': 'teve'}).param == 'teve'
+    assert tree.schema_cache_info().misses == 2
+
+def test_most_specific_leaf_factory_wins():
+
+    class Base():
+        pass
+
+    class Child(Base):
+        pass
+
+    class BaseLeafFactory(LeafFactory):
+        def create_schema(self):
+            return int
+
+    class ChildLeafFactory(LeafFactory):
+        def create_schema(self):
+            return str
+
+    tree = Tree()
+    # the MRO decides and not the order of the registration
+    tree.register_leaf_factory(Base, BaseLeafFactory)
+    tree.register_leaf_factory(Child, ChildLeafFactory)
+
+    class GrandChild(Child):
+        pass
+
+    @tree.root()
+    class Config():
+
+        base = Base
+        child = GrandChild
+
+    cfg = tree.load({'base': 42, 'child': 'teve'})
+
+    assert cfg.base == 42
+    assert cfg.child == 'teve'
+
+def test_leaf_factory_resolution_is_cached():
+    from collections.abc import Sized
+    from configpp.tree.item_factory import LeafFactoryRegistry
+
+    class Point():
+        def __len__(self):
+            return 2
+
+    class SizedLeafFactory(LeafFactory):
+        pass
+
+    registry = LeafFactoryRegistry({Sized: SizedLeafFactory})
+
+    # virtual subclass, not in the MRO
+    assert registry.resolve(Point) is SizedLeafFactory
+    assert registry.resolve(Point) is SizedLeafFactory
+    assert registry.resolve(int) is LeafFactory
+
+    registry[int] = SizedLeafFactory
+
+    assert registry.resolve(int) is SizedLeafFactory
+
+    del registry[int]
+
+    assert registry.resolve(int) is LeafFactory
@@ -1,3 +1,4 @@
+import pickle
 
 from configpp.tree import Tree, Settings
 
@@ -117,3 +118,29 @@ def test_dump_method_name_in_node_classes_sub():
 
     assert cfg.dump() == {'node1': {'param': 42}}
     assert cfg.node1.dump() == {'param': 42}
+
+class Limits():
+
+    rate = 10
+    burst = int
+
+def test_compact_nodes():
+
+    tree = Tree(Settings(compact_nodes = True, dump_method_name_in_node_classes = 'dump'))
+    tree.root()(Limits)
+
+    cfg = tree.load({'burst': 42})
+
+    assert isinstance(cfg, Limits)
+    assert type(cfg) is not Limits
+    assert set(type(cfg).__slots__) == {'rate', 'burst'}
+    assert vars(cfg) == {}
+    assert cfg.rate == 10
+    assert cfg.burst == 42
+    assert cfg.dump() == {'rate': 10, 'burst': 42}
+    assert tree.dump(cfg) == {'rate': 10, 'burst': 42}
+
+    copy = pickle.loads(pickle.dumps(cfg))
+
+    assert type(copy) is type(cfg)
+    assert copy.burst == 42